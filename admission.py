@@ -0,0 +1,106 @@
+import asyncio
+import math
+import time
+
+from fastapi import HTTPException
+
+# Per data source: how many requests may hold an Access connection at once, how
+# many more may queue behind them, and how long a queued request may wait before
+# it is turned away. Access copes badly with many concurrent readers on one .accdb,
+# so it is better to fail fast with a 503 than to let every request time out.
+ADMISSION_LIMITS = {
+    "access": {"max_concurrent": 5, "max_queue": 30, "queue_timeout": 10.0},
+    "prod_stats": {"max_concurrent": 3, "max_queue": 20, "queue_timeout": 10.0},
+    "fems": {"max_concurrent": 2, "max_queue": 10, "queue_timeout": 10.0},
+}
+DEFAULT_RETRY_AFTER_SECS = 5
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded wait queue and a queue-time budget."""
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._in_flight = 0
+        self._queued = 0
+        self._stats = {
+            "admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "total_wait_secs": 0.0,
+            "max_wait_secs": 0.0,
+            "total_hold_secs": 0.0,
+        }
+
+    async def acquire(self):
+        """Wait for a slot; returns a token to hand back to `release`."""
+        if self._semaphore.locked() and self._queued >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            raise self._unavailable("queue is full")
+
+        started = time.monotonic()
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._stats["rejected_timeout"] += 1
+            raise self._unavailable(f"no slot within {self.queue_timeout}s")
+        finally:
+            self._queued -= 1
+
+        admitted = time.monotonic()
+        waited = admitted - started
+        self._in_flight += 1
+        self._stats["admitted"] += 1
+        self._stats["total_wait_secs"] += waited
+        self._stats["max_wait_secs"] = max(self._stats["max_wait_secs"], waited)
+        return admitted
+
+    def release(self, token):
+        self._in_flight -= 1
+        self._stats["total_hold_secs"] += time.monotonic() - token
+        self._semaphore.release()
+
+    def retry_after(self):
+        # Rough time until the current queue drains, from the average hold time so far
+        admitted = self._stats["admitted"]
+        if not admitted:
+            return DEFAULT_RETRY_AFTER_SECS
+        avg_hold = self._stats["total_hold_secs"] / admitted
+        drain = avg_hold * (self._queued + 1) / self.max_concurrent
+        return max(1, math.ceil(drain))
+
+    def stats(self):
+        admitted = self._stats["admitted"]
+        return {
+            "name": self.name,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            **self._stats,
+            "avg_wait_secs": round(self._stats["total_wait_secs"] / admitted, 4) if admitted else 0.0,
+        }
+
+    def _unavailable(self, reason):
+        return HTTPException(
+            status_code=503,
+            detail=f"The {self.name} database is busy ({reason}). Please retry shortly.",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+
+admission_controllers = {
+    name: AdmissionController(name, **limits)
+    for name, limits in ADMISSION_LIMITS.items()
+}
+
+
+def admission_stats():
+    return {name: controller.stats() for name, controller in admission_controllers.items()}
@@ -1,5 +1,9 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import hashlib
+import threading
+import time
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -12,6 +16,12 @@ SECRET_KEY = "your-very-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+VERIFIED_TOKEN_CACHE_SIZE = 10000
+
+# 🗂️ Claims of tokens that already passed jwt.decode, by sha256 of the token,
+# so a token presented on every request is only verified once in its lifetime
+_verified_tokens = OrderedDict()  # token hash -> (claims, exp)
+_verified_tokens_lock = threading.Lock()
 
 def hash_password(password: str):
     return pwd_context.hash(password)
@@ -25,10 +35,32 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def decode_verified(token: str):
+    """jwt.decode with a cache of verified claims; never returns claims past their exp."""
+    key = hashlib.sha256(token.encode()).hexdigest()
+    with _verified_tokens_lock:
+        cached = _verified_tokens.get(key)
+        if cached is not None:
+            claims, exp = cached
+            if time.time() < exp:
+                _verified_tokens.move_to_end(key)
+                return dict(claims)
+            del _verified_tokens[key]
+
+    # Expired or unknown: let jwt.decode verify it (and raise for an expired token)
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    exp = claims.get("exp")
+    if isinstance(exp, (int, float)):
+        with _verified_tokens_lock:
+            _verified_tokens[key] = (claims, exp)
+            while len(_verified_tokens) > VERIFIED_TOKEN_CACHE_SIZE:
+                _verified_tokens.popitem(last=False)
+    return dict(claims)
+
 # ✅ Decode JWT and extract user info
 def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_verified(token)
         return {
             "usrid": payload.get("usrid"),
             "usrnamedisplay": payload.get("usrnamedisplay"),
@@ -57,6 +89,6 @@ def create_refresh_token(data: dict):
 
 def decode_token(token: str):
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return decode_verified(token)
     except:
         return None
\ No newline at end of file
@@ -0,0 +1,128 @@
+import asyncio
+import inspect
+
+from fastapi import HTTPException, Request, Response
+from fastapi import params as fastapi_params
+
+from .db_session import (
+    DbSession, ClientDisconnected, current_endpoint_path, get_access_session, get_prod_stats_session,
+    get_fems_session
+)
+from .reports import report_endpoints
+
+BATCH_MAX_ITEMS = 25
+# Items of one batch run on at most this many workers. Each item gets its own
+# sessions, closed as soon as it finishes, so a worker never holds a connection
+# (or admission slot) while it waits for another one
+BATCH_MAX_PARALLEL = 3
+
+SESSION_SOURCES = {
+    get_access_session: "access",
+    get_prod_stats_session: "prod_stats",
+    get_fems_session: "fems",
+}
+
+
+async def run_batch(items, request, warm=False, max_parallel=BATCH_MAX_PARALLEL, refresh_within=0):
+    """
+    Run report sub-requests, at most `max_parallel` at a time; results come back in request order.
+
+    With `warm`, each report is brought up to date in the cache instead of served
+    (see `report`), which is how the background warmer reuses this dispatcher;
+    results that would expire within `refresh_within` seconds are recomputed too.
+    """
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {BATCH_MAX_ITEMS} requests")
+
+    results = [None] * len(items)
+    queue = asyncio.Queue()
+    for index, item in enumerate(items):
+        queue.put_nowait((index, item))
+
+    async def worker():
+        while not queue.empty():
+            index, item = queue.get_nowait()
+            results[index] = await _run_item(item, request, warm, refresh_within)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(max_parallel, len(items)))]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        raise
+    return results
+
+
+async def _run_item(item, request, warm=False, refresh_within=0):
+    endpoint = report_endpoints.get(item.path)
+    if endpoint is None:
+        return {"id": item.id, "path": item.path, "status": 404, "error": "Unknown report path"}
+
+    # Every session the item opens, including those of open_session/fetch_from,
+    # gets the query timeout of the item's path rather than that of /batch
+    path_token = current_endpoint_path.set(item.path)
+    sessions = {}
+    try:
+        kwargs = _build_kwargs(endpoint, item, request, sessions)
+        if warm:
+            entry, fresh = await endpoint.warm(refresh_within=refresh_within, **kwargs)
+        else:
+            entry, fresh = await endpoint.entry(**kwargs)
+    except ClientDisconnected:
+        raise
+    except HTTPException as e:
+        return {"id": item.id, "path": item.path, "status": e.status_code, "error": e.detail}
+    except Exception as e:
+        return {"id": item.id, "path": item.path, "status": 500, "error": str(e)}
+    finally:
+        for session in sessions.values():
+            await session.close()
+        current_endpoint_path.reset(path_token)
+
+    # Age and staleness stand in for the Age/Warning headers of a direct request
+    return {
+        "id": item.id, "path": item.path, "status": 200, "data": entry.value,
+        "age": int(entry.age()), "stale": not fresh,
+    }
+
+
+def _build_kwargs(endpoint, item, request, sessions):
+    # Resolve the endpoint's parameters the way routing would: the batch request,
+    # a throwaway response, the item's own sessions, and query params from the item
+    kwargs = {}
+    for name, param in inspect.signature(endpoint).parameters.items():
+        default = param.default
+
+        if param.annotation is Request:
+            kwargs[name] = request
+        elif param.annotation is Response:
+            kwargs[name] = Response()
+        elif isinstance(default, fastapi_params.Depends):
+            source = SESSION_SOURCES.get(default.dependency)
+            if source is None:
+                raise HTTPException(status_code=400, detail=f"{item.path} cannot be run in a batch")
+            if source not in sessions:
+                sessions[source] = DbSession(source, request)
+            kwargs[name] = sessions[source]
+        elif name in item.params:
+            kwargs[name] = _convert(item.params[name], param.annotation, name)
+        elif isinstance(default, fastapi_params.Param):
+            if default.default is Ellipsis or (hasattr(default, "is_required") and default.is_required()):
+                raise HTTPException(status_code=422, detail=f"Missing query parameter '{name}'")
+            kwargs[name] = default.default
+        elif default is not inspect.Parameter.empty:
+            kwargs[name] = default
+        else:
+            raise HTTPException(status_code=422, detail=f"Missing query parameter '{name}'")
+    return kwargs
+
+
+def _convert(value, annotation, name):
+    if value is None or annotation is inspect.Parameter.empty:
+        return value
+    try:
+        return annotation(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail=f"Invalid value for query parameter '{name}'")
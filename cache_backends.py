@@ -0,0 +1,183 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# When the SQLite backend is over its limit it is trimmed to this fraction of it
+SQLITE_EVICT_TO = 0.9
+
+
+class MemoryBackend:
+    """Entries in this process only, in least-recently-used order."""
+
+    name = "memory"
+    persistent = False
+    blocking = False
+
+    def __init__(self):
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+    def touch(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def items(self):
+        return list(self._entries.items())
+
+    def evict(self, max_entries):
+        evicted = 0
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def clear(self):
+        self._entries.clear()
+
+    def count(self):
+        return len(self._entries)
+
+
+class SqliteBackend:
+    """
+    Entries in a local SQLite file, so every worker process on the machine shares
+    them: a result one worker queried is a hit for all the others. Entries are
+    pickled; keys are stored by their repr, which is stable for the str/int/date
+    tuples the caches use.
+
+    Calls do file I/O and may wait on other workers' locks (`blocking`), so async
+    code runs them on a thread. Reads never write: eviction drops the oldest
+    stored entries rather than the least recently used, and the row count is
+    tracked here and only re-read from the file when it may exceed the limit.
+    """
+
+    name = "sqlite"
+    persistent = True
+    blocking = True
+
+    def __init__(self, path, table):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+        if columns and "stored_at" not in columns:
+            # Table of an older version of the app; it only holds cached results
+            self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, entry BLOB NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_stored_at ON {table} (stored_at)")
+        # Upper bound on the rows in the table: every set counts as a new row
+        self._rows = self._count()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(f"SELECT entry FROM {self.table} WHERE key = ?", (repr(key),)).fetchone()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            # Written by an incompatible version of the app; treat as a miss
+            self.delete(key)
+            return None
+
+    def set(self, key, entry):
+        try:
+            data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return  # not shareable; the caller still has its result
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, entry, stored_at) VALUES (?, ?, ?)",
+                (repr(key), data, time.time()),
+            )
+            self._rows += 1
+
+    def touch(self, key):
+        pass  # eviction is by store time, so a hit costs no write
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (repr(key),))
+
+    def evict(self, max_entries):
+        with self._lock:
+            if self._rows <= max_entries:
+                return 0
+            # Trim to below the limit, so the table is only counted again after
+            # a batch of new entries rather than on every set
+            rows = self._count()
+            excess = max(0, rows - int(max_entries * SQLITE_EVICT_TO))
+            if excess:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY stored_at LIMIT ?)",
+                    (excess,),
+                )
+            self._rows = rows - excess
+            return excess
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._rows = 0
+
+    def count(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class SqliteLease:
+    """
+    Named lease in the shared SQLite file, for work that only one worker process
+    on the machine should do. `acquire` takes or renews it for `ttl` seconds and
+    returns whether this holder has it; a holder that dies loses it when it expires.
+    """
+
+    def __init__(self, path, name, holder):
+        self.name = name
+        self.holder = holder
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases "
+            "(name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def acquire(self, ttl):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (self.name, self.holder, now + ttl, now),
+            )
+            return cursor.rowcount == 1
+
+    def release(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import os
+import pickle
+import zlib
+
+from .day_shards import day_shards
+from .dimensions import dimension_cache
+from .reports import report_cache
+
+# The in-memory caches are written here (pickled and zlib-compressed) on shutdown
+# and periodically, and reloaded at startup so a restarted app starts warm
+CACHE_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "warm_caches.bin")
+CACHE_SNAPSHOT_INTERVAL_SECS = 300
+CACHE_SNAPSHOT_FORMAT = 1
+
+logger = logging.getLogger(__name__)
+
+
+def collect_caches():
+    # Shallow copies taken on the event loop; the cached values themselves are never mutated
+    return {
+        "format": CACHE_SNAPSHOT_FORMAT,
+        "dimensions": dimension_cache.export(),
+        "day_shards": day_shards.export_entries(),
+        "report_results": report_cache.export_entries(),
+    }
+
+
+def write_snapshot(contents, path=CACHE_SNAPSHOT_PATH):
+    data = zlib.compress(pickle.dumps(contents, protocol=pickle.HIGHEST_PROTOCOL), 6)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.partial"
+    with open(partial, "wb") as f:
+        f.write(data)
+    os.replace(partial, path)
+    return len(data)
+
+
+def save_caches(path=CACHE_SNAPSHOT_PATH):
+    return write_snapshot(collect_caches(), path)
+
+
+def load_caches(path=CACHE_SNAPSHOT_PATH):
+    """Reload a snapshot, keeping only what was computed from the current file versions."""
+    try:
+        with open(path, "rb") as f:
+            contents = pickle.loads(zlib.decompress(f.read()))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable cache snapshot %s: %s", path, e)
+        return None
+    if contents.get("format") != CACHE_SNAPSHOT_FORMAT:
+        return None
+
+    loaded = {"dimensions": dimension_cache.load(contents["dimensions"])}
+    for name, cache in (("day_shards", day_shards), ("report_results", report_cache)):
+        entries = contents[name]
+        loaded[name] = cache.import_entries(entries) if entries and not cache.backend.persistent else 0
+    return loaded
+
+
+async def save_caches_periodically():
+    while True:
+        await asyncio.sleep(CACHE_SNAPSHOT_INTERVAL_SECS)
+        try:
+            await asyncio.to_thread(write_snapshot, collect_caches())
+        except Exception as e:
+            logger.warning("Could not write cache snapshot: %s", e)
@@ -0,0 +1,111 @@
+from datetime import date, datetime, time, timedelta
+
+from .database import get_source_version
+from .result_cache import ResultCache
+
+# Event rows cached per day of dtTS1DownBegin, so a range that moves by a few
+# days only queries the days it has not seen yet
+SHARD_CACHE_MAX_DAYS = 20000
+# Days that are over and have no open events hardly ever change, so they are kept
+# for a day even though the file is edited all the time (an edit to such a day
+# shows up once its shard expires); today and days with open events (whose
+# DowntimeHrs is computed from Now()) are refetched soon and after every edit
+ELAPSED_DAY_TTL_SECS = 24 * 3600
+OPEN_DAY_TTL_SECS = 60
+# Missing days at most this many cached days apart are fetched in one query
+# (the cached days in between are simply refreshed), and a range never costs
+# more than SHARD_MAX_QUERIES queries: past that, one query covers all missing days
+SHARD_MERGE_GAP_DAYS = 7
+SHARD_MAX_QUERIES = 4
+
+day_shards = ResultCache(get_source_version, max_entries=SHARD_CACHE_MAX_DAYS, default_ttl=OPEN_DAY_TTL_SECS)
+
+
+async def fetch_days(
+    db, name, sql, start_dt, end_dt, params=(), day_column="dtTS1DownBegin", open_column="IsOpen", transform=None
+):
+    """
+    Rows (as dicts) of `sql` for every day from `start_dt` to `end_dt`, in day order.
+
+    `sql` takes the range as its first two parameters (`day_column BETWEEN ? AND ?`),
+    followed by `params`, and must select `open_column`: non-zero when a row's values
+    still depend on Now(). It is dropped from the result. `transform`, if given, maps
+    the fetched rows (dicts) to the rows that are cached and returned. Only the days
+    that are not cached are queried, in a few ranged queries (see `_runs`).
+    """
+    days = [start_dt.date() + timedelta(days=n) for n in range((end_dt.date() - start_dt.date()).days + 1)]
+    sources = (db.source,)
+    versions = day_shards.versions(sources)
+
+    shards = {}
+    missing = []
+    for day in days:
+        hit, records = day_shards.get((name, params, day), sources)
+        if hit:
+            shards[day] = records
+        else:
+            missing.append(day)
+
+    today = date.today()
+    for first, last in _runs(missing):
+        columns, rows = await db.fetch_all(
+            sql, (datetime.combine(first, time.min), datetime.combine(last, time(23, 59, 59))) + tuple(params)
+        )
+        day_index = columns.index(day_column)
+        open_index = columns.index(open_column)
+        open_days = {row[day_index].date() for row in rows if row[open_index]}
+
+        records = [{column: value for column, value in zip(columns, row) if column != open_column} for row in rows]
+        if transform is not None:
+            records = transform(records)
+
+        by_day = {first + timedelta(days=n): [] for n in range((last - first).days + 1)}
+        for record in records:
+            by_day[record[day_column].date()].append(record)
+
+        for day, day_records in by_day.items():
+            if day < today and day not in open_days:
+                # Stored without versions, so edits elsewhere in the file don't drop it
+                day_shards.set((name, params, day), day_records, (), ELAPSED_DAY_TTL_SECS)
+            else:
+                day_shards.set((name, params, day), day_records, versions, OPEN_DAY_TTL_SECS)
+            shards[day] = day_records
+
+    return [record for day in days for record in shards[day]]
+
+
+def sort_records(records, order_by):
+    """
+    Sort dicts the way Access applies ORDER BY: `order_by` is a list of
+    `(column, descending)`; text compares case-insensitively and NULLs sort lowest.
+    """
+    result = list(records)
+    for column, descending in reversed(order_by):
+        result.sort(key=lambda record: _sort_key(record[column]), reverse=descending)
+    return result
+
+
+def _sort_key(value):
+    if value is None:
+        return (0, "")
+    if isinstance(value, str):
+        return (1, value.casefold())
+    return (1, value)
+
+
+def _runs(days, max_gap=SHARD_MERGE_GAP_DAYS, max_runs=SHARD_MAX_QUERIES):
+    # Days grouped into (first, last) pairs, one query each; runs separated by a
+    # short stretch of cached days are merged, and too many runs become one
+    runs = []
+    for day in days:
+        if runs and (day - runs[-1][1]).days <= max_gap + 1:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    if len(runs) > max_runs:
+        runs = [[runs[0][0], runs[-1][1]]]
+    return runs
+
+
+def shard_stats():
+    return day_shards.stats()
@@ -0,0 +1,235 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from fastapi import HTTPException, Request
+
+from .admission import admission_controllers
+from .database import ACCESS_POOLS
+from .executors import run_in_executor, submit_to_executor
+
+# Query timeouts, per endpoint path, for the long-range reports; everything else
+# gets the default. A statement that runs past its timeout is cancelled.
+DEFAULT_QUERY_TIMEOUT_SECS = 30
+QUERY_TIMEOUT_SECS = {
+    "/offline_wtgs": 15,
+    "/offline_headings": 15,
+    "/overnight_rcc_resets": 60,
+    "/get_stoppages_for_wf": 120,
+    "/get_production_analysis": 120,
+    "/get_schedule_service_analysis": 120,
+    "/get_service_analysis": 120,
+    "/top_ten_faults": 90,
+    "/get_idf_analysis": 90,
+}
+# How often a running statement checks whether its client has gone away
+DISCONNECT_POLL_SECS = 0.5
+
+# Endpoint path that sessions opened in the current context run for, when it is
+# not the path of their request (e.g. the items of a /batch request)
+current_endpoint_path = ContextVar("current_endpoint_path", default=None)
+
+
+class ClientDisconnected(Exception):
+    """Raised when a statement was cancelled because the HTTP client went away."""
+
+
+class DbSession:
+    """
+    Pooled Access connection for one request.
+
+    The connection is only checked out on the first query, after the request
+    has been admitted by the data source's admission controller, and every
+    blocking ODBC call runs on the data source's own executor instead of the
+    event loop. Statements are cancelled when they exceed their timeout or
+    when the client behind `request` disconnects.
+    """
+
+    def __init__(self, source, request=None):
+        self.source = source
+        self.request = request
+        self.pool = ACCESS_POOLS[source]
+        self.admission = admission_controllers[source]
+        # Path whose entry in QUERY_TIMEOUT_SECS applies
+        self.endpoint_path = current_endpoint_path.get()
+        if self.endpoint_path is None and request is not None:
+            self.endpoint_path = request.url.path
+        self.conn = None
+        self._admission_token = None
+
+    async def connection(self):
+        if self.conn is None:
+            if self._admission_token is None:
+                self._admission_token = await self.admission.acquire()
+            self.conn = await run_in_executor(self.source, self.pool.acquire)
+        return self.conn
+
+    async def fetch_all(self, sql, params=(), timeout=None):
+        """Run a query and return `(columns, rows)`."""
+        return await self._execute(_fetch_all, sql, params, timeout)
+
+    async def fetch_dicts(self, sql, params=(), timeout=None):
+        columns, rows = await self.fetch_all(sql, params, timeout)
+        return [dict(zip(columns, row)) for row in rows]
+
+    async def fetch_one(self, sql, params=(), timeout=None):
+        return await self._execute(_fetch_one, sql, params, timeout)
+
+    def query_timeout(self):
+        return QUERY_TIMEOUT_SECS.get(self.endpoint_path, DEFAULT_QUERY_TIMEOUT_SECS)
+
+    async def close(self):
+        try:
+            if self.conn is not None:
+                conn, self.conn = self.conn, None
+                await run_in_executor(self.source, self.pool.release, conn)
+        finally:
+            if self._admission_token is not None:
+                token, self._admission_token = self._admission_token, None
+                self.admission.release(token)
+
+    # ---- internals ------------------------------------------------------------
+
+    async def _execute(self, func, sql, params, timeout):
+        timeout = self.query_timeout() if timeout is None else timeout
+        conn = await self.connection()
+        cursor = await run_in_executor(self.source, _open_cursor, conn, timeout)
+        future = submit_to_executor(self.source, func, cursor, sql, params)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                done, _ = await asyncio.wait({future}, timeout=max(0, min(DISCONNECT_POLL_SECS, remaining)))
+            except asyncio.CancelledError:
+                self._cancel(cursor, future)
+                raise
+            if done:
+                return future.result()
+
+            if time.monotonic() >= deadline:
+                self._cancel(cursor, future)
+                raise HTTPException(
+                    status_code=504,
+                    detail=f"The query took longer than {timeout}s and was cancelled",
+                )
+            if self.request is not None and await self.request.is_disconnected():
+                self._cancel(cursor, future)
+                raise ClientDisconnected(self.request.url.path)
+
+    def _cancel(self, cursor, future):
+        # SQLCancel is safe to call from another thread while the statement runs
+        try:
+            cursor.cancel()
+        except Exception:
+            pass
+        # The worker thread may still be inside the statement, so detach the
+        # connection and its admission slot now (a later query on this session
+        # is admitted again and gets a fresh connection). Both are given back
+        # only once the statement has actually returned, so admission never
+        # lets more statements run than max_concurrent.
+        conn, self.conn = self.conn, None
+        token, self._admission_token = self._admission_token, None
+        future.add_done_callback(self._discard_after_cancel(conn, token))
+
+    def _discard_after_cancel(self, conn, token):
+        # Done-callbacks run on the event loop thread
+        def discard(future):
+            _consume_result(future)
+            released = submit_to_executor(self.source, self.pool.release, conn, True)
+            released.add_done_callback(release_slot)
+
+        def release_slot(future):
+            _consume_result(future)
+            if token is not None:
+                self.admission.release(token)
+
+        return discard
+
+
+def _consume_result(future):
+    # The outcome of a cancelled statement is of no interest; retrieve it so
+    # asyncio doesn't warn about an exception that was never retrieved
+    if not future.cancelled():
+        future.exception()
+
+
+def _open_cursor(conn, timeout):
+    # Also ask the driver to enforce the timeout where it supports it
+    conn.timeout = int(timeout)
+    return conn.cursor()
+
+
+def _fetch_all(cursor, sql, params):
+    try:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        columns = [column[0] for column in cursor.description]
+        return columns, rows
+    finally:
+        cursor.close()
+
+
+def _fetch_one(cursor, sql, params):
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+@asynccontextmanager
+async def open_session(source, request=None):
+    """Session on its own pooled connection, for work that runs beside the request's session."""
+    session = DbSession(source, request)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def fetch_from(source, sql, params=(), request=None, timeout=None):
+    """One-off `fetch_all` on its own connection; lets queries against different files run side by side."""
+    async with open_session(source, request) as session:
+        return await session.fetch_all(sql, params, timeout)
+
+
+async def gather_queries(*coros):
+    """
+    Run independent query coroutines concurrently and return their results in order.
+
+    If one fails the others are cancelled (which cancels their statements) before
+    the error is re-raised, so a bad parameter never leaves a query running.
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+# Dependencies yielding a lazily-connected session per data source
+async def get_access_session(request: Request):
+    session = DbSession("access", request)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+async def get_prod_stats_session(request: Request):
+    session = DbSession("prod_stats", request)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+async def get_fems_session(request: Request):
+    session = DbSession("fems", request)
+    try:
+        yield session
+    finally:
+        await session.close()
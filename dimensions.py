@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from .database import get_source_version
+
+# Lookup tables of the RCC database, by their ID column. They are small and rarely
+# change, so event queries select only the IDs and names are resolved from memory
+DIMENSION_TABLES = {
+    "tblFacility": "facID",
+    "tblAsset": "astID",
+    "tblRationale": "rtnID",
+    "tblReason": "rsnID",
+    "tblStopCodes": "stpID",
+    "tblFaultCode": "fltID",
+    "tblRCCResetType": "rsttypID",
+    "tblRCCResetBy": "rstbyID",
+}
+# The RCC file's version is re-read at most this often
+DIMENSION_CHECK_INTERVAL_SECS = 2.0
+
+
+class Dimensions:
+    """One loaded copy of the lookup tables: `{table: {id: row dict}}`."""
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def row(self, table, id):
+        """The row an `INNER JOIN`/`LEFT JOIN` on `id` would match, or None (also for a NULL id)."""
+        return self.tables[table].get(id)
+
+    def value(self, table, id, column):
+        # What a LEFT JOINed column reads as: NULL when nothing matches
+        row = self.tables[table].get(id)
+        return row[column] if row is not None else None
+
+
+class DimensionCache:
+    """Loads the lookup tables on first use and again whenever the RCC file changes."""
+
+    def __init__(self, source="access"):
+        self.source = source
+        self._dimensions = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._stats = {"loads": 0, "loaded_at": None}
+
+    async def get(self, db):
+        """Current lookup tables, loading them over `db` if they are missing or outdated."""
+        if self._dimensions is not None and self._is_current():
+            return self._dimensions
+
+        async with self._lock:
+            version = get_source_version(self.source)
+            if self._dimensions is not None and version == self._version:
+                return self._dimensions  # loaded by the request we waited for
+
+            tables = {}
+            for table, id_column in DIMENSION_TABLES.items():
+                columns, rows = await db.fetch_all(f"SELECT * FROM {table}")
+                records = (dict(zip(columns, row)) for row in rows)
+                tables[table] = {record[id_column]: record for record in records}
+            self._dimensions = Dimensions(tables)
+            self._version = version
+            self._checked_at = time.monotonic()
+            self._stats["loads"] += 1
+            self._stats["loaded_at"] = time.time()
+            return self._dimensions
+
+    def _is_current(self):
+        now = time.monotonic()
+        if now - self._checked_at < DIMENSION_CHECK_INTERVAL_SECS:
+            return True
+        if get_source_version(self.source) != self._version:
+            return False
+        self._checked_at = now
+        return True
+
+    def export(self):
+        if self._dimensions is None:
+            return None
+        return {"version": self._version, "tables": self._dimensions.tables}
+
+    def load(self, exported):
+        """Reuse persisted lookup tables if they came from the current version of the file."""
+        if exported is None or exported["version"] != get_source_version(self.source):
+            return False
+        self._dimensions = Dimensions(exported["tables"])
+        self._version = exported["version"]
+        self._checked_at = time.monotonic()
+        return True
+
+    def stats(self):
+        tables = self._dimensions.tables if self._dimensions is not None else {}
+        return {**self._stats, "rows": {table: len(rows) for table, rows in tables.items()}}
+
+
+dimension_cache = DimensionCache()
+
+
+def same_text(value, other):
+    """Text `=` as Access evaluates it: case-insensitive, and never true for NULL."""
+    return value is not None and value.casefold() == other.casefold()
+
+
+def text_in(value, names):
+    """Text `IN (...)` as Access evaluates it."""
+    return value is not None and any(value.casefold() == name.casefold() for name in names)
+
+
+def text_not_in(value, names):
+    """Text `NOT IN (...)` as Access evaluates it: NULL is neither in nor not in."""
+    return value is not None and not text_in(value, names)
@@ -0,0 +1,86 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Worker threads per data source. Each Access file gets its own bounded pool so a
+# slow event query can only ever tie up the "access" threads, never prod stats,
+# FEMS or the Postgres/auth path (which stays on the default AnyIO thread pool).
+EXECUTOR_SIZES = {
+    "access": 8,
+    "prod_stats": 4,
+    "fems": 2,
+}
+POSTGRES_THREADPOOL_SIZE = 20
+
+
+class _CountingExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that keeps its own count of queued and running calls, for the stats."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._count_lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._count_lock:
+            self.queued += 1
+        try:
+            future = super().submit(self._run, fn, *args, **kwargs)
+        except BaseException:
+            with self._count_lock:
+                self.queued -= 1
+            raise
+        # A call cancelled before it started never reaches _run
+        future.add_done_callback(self._forget_if_cancelled)
+        return future
+
+    def _run(self, fn, *args, **kwargs):
+        with self._count_lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._count_lock:
+                self.active -= 1
+
+    def _forget_if_cancelled(self, future):
+        if future.cancelled():
+            with self._count_lock:
+                self.queued -= 1
+
+
+_executors = {
+    name: _CountingExecutor(max_workers=size, thread_name_prefix=f"db-{name}")
+    for name, size in EXECUTOR_SIZES.items()
+}
+
+
+async def run_in_executor(source, func, *args, **kwargs):
+    """Run a blocking database call on the executor dedicated to `source`."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executors[source], functools.partial(func, *args, **kwargs))
+
+
+def submit_to_executor(source, func, *args, **kwargs):
+    """Schedule a blocking call on `source`'s executor and return its asyncio future."""
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(_executors[source], functools.partial(func, *args, **kwargs))
+
+
+def executor_stats():
+    return {
+        name: {
+            "max_workers": EXECUTOR_SIZES[name],
+            "active": executor.active,
+            "queued": executor.queued,
+        }
+        for name, executor in _executors.items()
+    }
+
+
+def shutdown_executors():
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,11 +1,33 @@
 from fastapi import FastAPI, HTTPException, Depends, Request, APIRouter, Query, Response, Cookie, Body
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from rcc_app import models, schemas, crud
 from collections import defaultdict
-from .database import engine, Base, get_db, get_db_access, get_db_prod_stats, get_db_fems
+from .database import (
+    engine, async_engine, Base, get_async_db, ACCESS_POOLS, get_pool_stats, ACCESS_SNAPSHOTS, USE_LOCAL_SNAPSHOTS,
+    SNAPSHOT_CHECK_INTERVAL_SECS, get_snapshot_stats
+)
+from .odbc_pool import PoolTimeout
+from .admission import admission_stats, DEFAULT_RETRY_AFTER_SECS
+from .db_session import (
+    DbSession, ClientDisconnected, get_access_session, get_prod_stats_session, get_fems_session, open_session, fetch_from,
+    gather_queries
+)
+from .executors import POSTGRES_THREADPOOL_SIZE, executor_stats, shutdown_executors, run_in_executor
+from .reports import report, report_stats, LIVE_REPORT_TTL_SECS
+from .batch import run_batch
+from .day_shards import fetch_days, sort_records, shard_stats
+from .dimensions import dimension_cache, same_text, text_not_in
+from .warmer import cache_warmer, WARM_ENABLED
+from .cache_persistence import load_caches, save_caches, save_caches_periodically
+from .user_cache import user_cache
+from .timesheet import timesheet_charts, timesheet_hours
 from datetime import datetime,timedelta,time 
 import pyodbc
+import logging
 import socket
 import sys
 import os
@@ -14,16 +36,20 @@ from fastapi import Security
 from fastapi import status
 from jose import JWTError
 from openpyxl import load_workbook
-from typing import List, Generator
+from typing import List
 from collections import defaultdict
 from jose import jwt
 from passlib.context import CryptContext
+from anyio import to_thread
+import asyncio
 from .auth_utils import (
     create_access_token, create_refresh_token, verify_password, decode_token, require_role, get_current_user
 )
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+logger = logging.getLogger(__name__)
+
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
@@ -41,16 +67,114 @@ app.add_middleware(
 )
 
 
+# Take the local snapshots before any connection is opened, so the pools start on the copies
+@app.on_event("startup")
+def take_initial_snapshots():
+    if not USE_LOCAL_SNAPSHOTS:
+        return
+    for name, snapshot in ACCESS_SNAPSHOTS.items():
+        if not snapshot.refresh():
+            logger.warning("No local snapshot for %s, reading the source file: %s", name, snapshot.stats()["last_error"])
+
+# Start warm: reload the caches saved by the previous run (after the snapshots, so
+# the file versions they are checked against are the ones we'll serve)
+@app.on_event("startup")
+async def restore_caches():
+    loaded = load_caches()
+    if loaded:
+        logger.info("Restored caches from disk: %s", loaded)
+    app.state.cache_save_task = asyncio.create_task(save_caches_periodically())
+
+# Re-copy a source file when it changes and move its pool over to the new copy
+async def refresh_snapshots_periodically():
+    while True:
+        await asyncio.sleep(SNAPSHOT_CHECK_INTERVAL_SECS)
+        for name, snapshot in ACCESS_SNAPSHOTS.items():
+            try:
+                if await run_in_executor(name, snapshot.refresh):
+                    ACCESS_POOLS[name].retire_all()
+                    logger.info("Switched %s to snapshot %s", name, snapshot.current_path)
+            except Exception as e:
+                logger.warning("Snapshot refresh failed for %s: %s", name, e)
+
+@app.on_event("startup")
+async def start_snapshot_refresh():
+    if USE_LOCAL_SNAPSHOTS:
+        app.state.snapshot_task = asyncio.create_task(refresh_snapshots_periodically())
+
+# Keep the dashboards' standard date windows warm in the result cache
+@app.on_event("startup")
+async def start_cache_warmer():
+    if WARM_ENABLED:
+        app.state.warmer_task = asyncio.create_task(cache_warmer.run_forever())
+
+# Open the minimum number of pooled Access connections up front so the first requests don't pay for it
+@app.on_event("startup")
+def fill_connection_pools():
+    for name, pool in ACCESS_POOLS.items():
+        try:
+            pool.fill()
+        except pyodbc.Error as e:
+            logger.warning("Could not pre-open connections for %s: %s", name, e)
+
+# Access queries run on their own executors (see executors.py), so the default
+# thread pool only serves the sync Postgres/auth endpoints - size it for that
+@app.on_event("startup")
+async def size_auth_threadpool():
+    to_thread.current_default_thread_limiter().total_tokens = POSTGRES_THREADPOOL_SIZE
+
+# A pool that stays exhausted past its acquire timeout means the database is overloaded
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(DEFAULT_RETRY_AFTER_SECS)},
+    )
+
+# The client went away and its query was cancelled - nobody is left to read a response
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    return Response(status_code=499)
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for name in ("snapshot_task", "warmer_task", "cache_save_task"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+
+@app.on_event("shutdown")
+def persist_caches():
+    try:
+        save_caches()
+    except Exception as e:
+        logger.warning("Could not save caches: %s", e)
+
+@app.on_event("shutdown")
+def close_connection_pools():
+    for pool in ACCESS_POOLS.values():
+        pool.close_all()
+    shutdown_executors()
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
+
 # AUTHENTICATION AND AUTHORIZATION FUNCTION ----------------------------------------------------------------------------------------
 # LOGIN API
 @app.post("/login/")
-def login(login_data: schemas.Login, request: Request, response: Response, db: Session = Depends(get_db)):
+async def login(login_data: schemas.Login, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
 
     # Get the IP address of the client
     client_ip = request.client.host
 
     # Query user by email
-    user = db.query(models.User).filter(models.User.usremail == login_data.email).first()
+    result = await db.execute(
+        select(models.User).options(selectinload(models.User.role)).filter(models.User.usremail == login_data.email)
+    )
+    user = result.scalars().first()
 
     # Handle case where the user does not exist
     if not user:
@@ -63,11 +187,12 @@ def login(login_data: schemas.Login, request: Request, response: Response, db: S
             reason="User not found"
         )
         db.add(log_attempt)
-        db.commit()
+        await db.commit()
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Validate the password New
-    if not verify_password(login_data.password, user.password):
+    # bcrypt is deliberately slow; keep it off the event loop
+    if not await to_thread.run_sync(verify_password, login_data.password, user.password):
         log_attempt = models.LoginAttempt(
             usrid=user.usrid, 
             ipaddr=client_ip, 
@@ -76,7 +201,7 @@ def login(login_data: schemas.Login, request: Request, response: Response, db: S
             reason="Invalid password"
         )
         db.add(log_attempt)
-        db.commit()
+        await db.commit()
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     # Log the successful login attempt new
@@ -88,7 +213,9 @@ def login(login_data: schemas.Login, request: Request, response: Response, db: S
         reason="Successful Login"
     )
     db.add(log_attempt)
-    db.commit()
+    await db.commit()
+    # The user was just read from the database; start their cache entry from that
+    user_cache.put(user)
 
     access_token = create_access_token({
         "sub": user.usremail,
@@ -151,7 +278,7 @@ def logout(response: Response):
     response.delete_cookie(key="refresh_token", path="/refresh")
     return {"message": "Logged out"}
 
-def get_current_user(token: str = Security(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Security(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -166,16 +293,23 @@ def get_current_user(token: str = Security(oauth2_scheme), db: Session = Depends
         if user_email is None:
             raise credentials_exception
         
-        user = db.query(models.User).filter(models.User.usremail == user_email).first()
+        # Resolved users are cached, so most requests never touch Postgres here
+        user = user_cache.get_by_email(user_email)
         if user is None:
-            raise credentials_exception
+            result = await db.execute(
+                select(models.User).options(selectinload(models.User.role)).filter(models.User.usremail == user_email)
+            )
+            user = result.scalars().first()
+            if user is None:
+                raise credentials_exception
+            user_cache.put(user)
         
         return user
     except JWTError:
         raise credentials_exception
 
 @app.get("/me")
-def read_current_user(current_user: models.User = Depends(get_current_user)):
+async def read_current_user(current_user: models.User = Depends(get_current_user)):
     return {
         "id": current_user.usrid,
         "name": current_user.usrnamedisplay,
@@ -193,13 +327,19 @@ def role_required(allowed_roles: List[str]):
 
 # FETCH USER ACCOUNT API
 @app.get("/user/{user_id}")
-def get_user_info(user_id: int, db: Session = Depends(get_db)):
+async def get_user_info(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     User information retrieval endpoint
     """
-    user = db.query(models.User).filter(models.User.usrid == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user = user_cache.get_by_id(user_id)
+    if user is None:
+        result = await db.execute(
+            select(models.User).options(selectinload(models.User.role)).filter(models.User.usrid == user_id)
+        )
+        user = result.scalars().first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        user_cache.put(user)
     return {"id": user.usrid, "name": user.usrnamedisplay}
 
 
@@ -207,21 +347,20 @@ def get_user_info(user_id: int, db: Session = Depends(get_db)):
 
 #FETCH STOPPAGE SUMMARY DATA FOR HEADING API
 @app.get("/stoppage_headings")
-def get_stoppage_legend(
+@report("stoppage_headings")
+async def get_stoppage_legend(
     # user=Depends(require_role(["Admin"])),
     startdate: str = Query(..., description="Start date in YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    db: DbSession = Depends(get_access_session)
 ):
-    cursor = db.cursor()
-
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-    cursor.execute(
+    columns, rows = await db.fetch_all(
         """
         SELECT 
             COUNT(IIf(r.rtnName NOT LIKE '*Communication*' 
@@ -244,8 +383,6 @@ def get_stoppage_legend(
         (start_dt, end_dt)
     )
 
-    rows = cursor.fetchall()
-
     # Assuming the query will return one row with the count result
     if rows:
         total_stoppages = rows[0][0]
@@ -275,71 +412,79 @@ def get_stoppage_legend(
     return result
 
 @app.get("/summary_stoppages")
-def get_summary_stoppages(
+@report("summary_stoppages")
+async def get_summary_stoppages(
     startdate: str = Query(..., description="Start date in YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    db: DbSession = Depends(get_access_session)
 ):
-    cursor = db.cursor()
-
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-    cursor.execute("""
+    # Aggregate in Access per facility, rationale and "reset by RCC", and classify
+    # the (few) groups in Python with the same rules as before
+    columns, rows = await db.fetch_all("""
         SELECT 
-            f.facABBR AS windfarm,
-            r.rtnName AS category,
-            e.dtTS1DownBegin AS stop_time,
-            e.dtTS3MaintBegin AS maint_time,
-            e.dtTS7EventFinish AS start_time,
-            e.evntWindSpeed,
-            e.rstbyID
+            e.facID,
+            e.rtnID,
+            IIF(e.rstbyID = 2, 1, 0) AS ResetByRCC,
+            COUNT(*) AS stops,
+            COUNT(DateDiff('s', e.dtTS1DownBegin, e.dtTS7EventFinish)) AS downtime_count,
+            SUM(DateDiff('s', e.dtTS1DownBegin, e.dtTS7EventFinish)) AS downtime_secs,
+            COUNT(DateDiff('s', e.dtTS3MaintBegin, e.dtTS7EventFinish)) AS service_count,
+            SUM(DateDiff('s', e.dtTS3MaintBegin, e.dtTS7EventFinish)) AS service_secs,
+            COUNT(e.evntWindSpeed) AS wind_count,
+            SUM(e.evntWindSpeed) AS wind_sum
         FROM 
-            ((tblEvent AS e
-            INNER JOIN tblFacility AS f ON e.facID = f.facID)
-            INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
+            tblEvent AS e
         WHERE       
             e.dtTS1DownBegin BETWEEN ? AND ? 
+        GROUP BY 
+            e.facID, e.rtnID, IIF(e.rstbyID = 2, 1, 0)
     """, (start_dt, end_dt))
-
-    rows = cursor.fetchall()
+    dims = await dimension_cache.get(db)
 
     summary = defaultdict(lambda: defaultdict(int))
-    downtime_data = defaultdict(list)
-    service_data = defaultdict(list)
-    wind_speed_data = defaultdict(list)  # 新增
+    downtime_data = defaultdict(lambda: [0, 0])  # windfarm -> [total hours, events]
+    service_data = defaultdict(lambda: [0, 0])
+    wind_speed_data = defaultdict(lambda: [0, 0])  # 新增
 
     for row in rows:
-        wf = row.windfarm
-        cat = row.category.strip().lower() if row.category else ""
-        summary[wf]["Total Stops"] += 1
+        f = dims.row("tblFacility", row.facID)
+        r = dims.row("tblRationale", row.rtnID)
+        if f is None or r is None:
+            continue  # INNER JOINs
+        wf = f["facABBR"]
+        cat = r["rtnName"].strip().lower() if r["rtnName"] else ""
+        summary[wf]["Total Stops"] += row.stops
 
         is_fault = cat in ["fault", "idf fault", "idf outage", "schedule outage", "communication"]
 
         if cat == "schedule service":
-            summary[wf]["Scheduled Services"] += 1
+            summary[wf]["Scheduled Services"] += row.stops
         elif cat in ["fault", "idf fault", "communication"]:
-            if row.rstbyID == 2:
-                summary[wf]["Faults Reset by RCC"] += 1
+            if row.ResetByRCC:
+                summary[wf]["Faults Reset by RCC"] += row.stops
             else:
-                summary[wf]["Faults Not Reset by RCC"] += 1
+                summary[wf]["Faults Not Reset by RCC"] += row.stops
         else:
-            summary[wf]["Non Scheduled Services"] += 1
+            summary[wf]["Non Scheduled Services"] += row.stops
 
         if not is_fault:
-            if row.start_time and row.stop_time:
-                dt = (row.start_time - row.stop_time).total_seconds() / 3600
-                downtime_data[wf].append(dt)
+            if row.downtime_count:
+                downtime_data[wf][0] += row.downtime_secs / 3600
+                downtime_data[wf][1] += row.downtime_count
 
-            if row.maint_time and row.start_time:
-                mt = (row.start_time - row.maint_time).total_seconds() / 3600
-                service_data[wf].append(mt)
+            if row.service_count:
+                service_data[wf][0] += row.service_secs / 3600
+                service_data[wf][1] += row.service_count
 
-        if row.evntWindSpeed is not None:
-            wind_speed_data[wf].append(row.evntWindSpeed)
+        if row.wind_count:
+            wind_speed_data[wf][0] += row.wind_sum
+            wind_speed_data[wf][1] += row.wind_count
 
     result = {
         "stoppages": [],
@@ -355,9 +500,12 @@ def get_summary_stoppages(
             })
 
     for wf in summary.keys():
-        avg_down = round(sum(downtime_data[wf]) / len(downtime_data[wf]), 2) if downtime_data[wf] else 0
-        avg_service = round(sum(service_data[wf]) / len(service_data[wf]), 2) if service_data[wf] else 0
-        avg_wind = round(sum(wind_speed_data[wf]) / len(wind_speed_data[wf]), 2) if wind_speed_data[wf] else None
+        down_hrs, down_n = downtime_data[wf]
+        service_hrs, service_n = service_data[wf]
+        wind_sum, wind_n = wind_speed_data[wf]
+        avg_down = round(down_hrs / down_n, 2) if down_n else 0
+        avg_service = round(service_hrs / service_n, 2) if service_n else 0
+        avg_wind = round(wind_sum / wind_n, 2) if wind_n else None
 
         result["avg_hours"].append({
             "windfarm": wf,
@@ -370,41 +518,44 @@ def get_summary_stoppages(
 
 #FETCH STOPPAGE SUMMARY FOR LEGEND SECTION API
 @app.get("/stoppage_legend")
-def get_stoppage_legend(
+@report("stoppage_legend")
+async def get_stoppage_legend(
     startdate: str = Query(..., description="Start date in YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    db: DbSession = Depends(get_access_session)
 ):
-    cursor = db.cursor()
-
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-    cursor.execute(
+    # Count per rationale and reason in Access; classify the groups in Python
+    columns, rows = await db.fetch_all(
         """
         SELECT 
-            r.rtnName AS category,
-            rr.rsnName AS rsnName
+            e.rtnID,
+            e.rsnID,
+            COUNT(*) AS stops
         FROM 
-            ((tblEvent AS e
-            INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-            INNER JOIN tblReason AS rr ON e.rsnID = rr.rsnID)
+            tblEvent AS e
         WHERE 
             e.dtTS1DownBegin BETWEEN ? AND ? 
-
+        GROUP BY 
+            e.rtnID, e.rsnID
         """,
         (start_dt, end_dt)
     )
-
-    rows = cursor.fetchall()
+    dims = await dimension_cache.get(db)
     legend_summary = defaultdict(lambda: defaultdict(int))
 
     for row in rows:
-        cat = row.category.strip().lower() if row.category else ""
-        rsn = row.rsnName.strip() if row.rsnName else "Unknown"
+        r = dims.row("tblRationale", row.rtnID)
+        rr = dims.row("tblReason", row.rsnID)
+        if r is None or rr is None:
+            continue  # INNER JOINs
+        cat = r["rtnName"].strip().lower() if r["rtnName"] else ""
+        rsn = rr["rsnName"].strip() if rr["rsnName"] else "Unknown"
 
         if cat == "schedule service":
             typ = "Scheduled Services"
@@ -413,7 +564,7 @@ def get_stoppage_legend(
         else:
             typ = "Non Scheduled Services"
 
-        legend_summary[typ][rsn] += 1
+        legend_summary[typ][rsn] += row.stops
 
     result = []
     for typ, reasons in legend_summary.items():
@@ -431,15 +582,12 @@ def get_stoppage_legend(
 
 #FETCH DATA FOR RCC OVERNIGHT RESETS API
 @app.get("/overnight_rcc_resets")
+@report("overnight_rcc_resets", sources=("access", "prod_stats"))
 async def get_overnight_rcc_resets(
+    request: Request,
     startdate: str = Query(..., description="Start date in format YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in format YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access),
-    db_prod: pyodbc.Connection = Depends(get_db_prod_stats),
 ):
-    cursor = db.cursor()
-    prod_cursor = db_prod.cursor()
-
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d")
@@ -452,8 +600,9 @@ async def get_overnight_rcc_resets(
     if overnight_end <= overnight_start:
         overnight_end += timedelta(days=1)
 
-    cursor.execute(
-        """
+    # The resets (RCC database) and the daily energy figures (Prod Stats database)
+    # live in different files, so fetch both at once and join them in memory
+    events_query = """
         SELECT 
             f.facABBR AS WindFarm,
             a.astDisplay AS WTG,
@@ -481,16 +630,24 @@ async def get_overnight_rcc_resets(
             f.facABBR ASC,
             a.astDisplay ASC,
             e.dtTS1DownBegin DESC;
-        """,
-        (overnight_start, overnight_end)
-    )
+        """
+    energy_query = """
+        SELECT astID, spDate, spActEnergyExport
+        FROM tblStatsProd
+        WHERE spDate BETWEEN ? AND ?
+        """
 
-    rows = cursor.fetchall()
-    columns = [col[0] for col in cursor.description]
+    (columns, rows), (_, energy_rows) = await gather_queries(
+        fetch_from("access", events_query, (overnight_start, overnight_end), request),
+        fetch_from("prod_stats", energy_query, (start_dt, end_dt + timedelta(days=1) - timedelta(seconds=1)), request),
+    )
 
-    def daterange(start_date: datetime, end_date: datetime) -> Generator[datetime, None, None]:
-        for n in range((end_date - start_date).days + 1):
-            yield start_date + timedelta(n)
+    # (astID, day) -> spActEnergyExport, keeping the first row like the old per-row fetchone()
+    daily_energy = {}
+    for ast_id, sp_date, energy in energy_rows:
+        if isinstance(sp_date, datetime):
+            sp_date = sp_date.date()
+        daily_energy.setdefault((ast_id, sp_date), energy)
 
     results = []
     for row in rows:
@@ -500,29 +657,21 @@ async def get_overnight_rcc_resets(
         start_time = row_dict["StartTime"]
         ast_id = row_dict["astID"]
 
-        matched = False
-        for d in daterange(start_dt, end_dt):
-            overnight_start = datetime.combine(d - timedelta(days=1), time(19, 0))  
-            overnight_end = datetime.combine(d, time(7, 0)) 
-
-            if overnight_start <= stop_time <= overnight_end:
-                matched = True
-                break  
-
-        if not matched:
-            continue 
+        # The night a stop falls in runs from 19:00 the day before to 07:00 on day d;
+        # work d out from the stop time instead of scanning every day of the range
+        if stop_time.time() <= time(7, 0):
+            d = datetime.combine(stop_time.date(), time.min)
+        elif stop_time.time() >= time(19, 0):
+            d = datetime.combine(stop_time.date() + timedelta(days=1), time.min)
+        else:
+            continue
+        if not start_dt <= d <= end_dt:
+            continue
+        overnight_end = datetime.combine(d, time(7, 0))
 
         saved_time_hrs = max(0, (overnight_end - start_time).total_seconds() / 3600)
 
-        prod_cursor.execute(
-            """
-            SELECT spActEnergyExport FROM tblStatsProd
-            WHERE astID = ? AND spDate = ?
-            """,
-            ast_id, d.date()  
-        )
-        prod_row = prod_cursor.fetchone()
-        daily_energy_kwh = prod_row[0] if prod_row else 0
+        daily_energy_kwh = daily_energy.get((ast_id, d.date()), 0)
         daily_energy_mwh = daily_energy_kwh / 1000
         saved_energy = round((daily_energy_mwh / 24) * saved_time_hrs, 3)
 
@@ -536,20 +685,19 @@ async def get_overnight_rcc_resets(
 
 #FETCH RESPONSE TIME DATA API
 @app.get("/get_rcc_response_time")
-def get_rcc_response_time(
+@report("get_rcc_response_time")
+async def get_rcc_response_time(
     startdate: str = Query(..., description="Start date in YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    db: DbSession = Depends(get_access_session)
 ):
-    cursor = db.cursor()
-
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-    cursor.execute("""
+    columns, rows = await db.fetch_all("""
         SELECT 
             f.facABBR AS windfarm,
             e.dtTS2RCCNotify AS notify_time,
@@ -566,8 +714,6 @@ def get_rcc_response_time(
             e.dtTS1DownBegin IS NOT NULL
     """, (start_dt, end_dt))
 
-    rows = cursor.fetchall()
-
     response_time_data = defaultdict(list)
 
     for row in rows:
@@ -588,12 +734,12 @@ def get_rcc_response_time(
 
 #FETCH OFFLINE DATA FOR HEADING API
 @app.get("/offline_headings")
-def get_stoppage_legend(
-    db: pyodbc.Connection = Depends(get_db_access)
+@report("offline_headings", ttl=LIVE_REPORT_TTL_SECS)
+async def get_stoppage_legend(
+    db: DbSession = Depends(get_access_session)
 ):
-    cursor = db.cursor()
 
-    cursor.execute(
+    columns, rows = await db.fetch_all(
         """
         SELECT 
             COUNT(IIf(e.dtTS7EventFinish IS NULL, 1, NULL)) AS total_offline
@@ -603,8 +749,6 @@ def get_stoppage_legend(
         """
     )
 
-    rows = cursor.fetchall()
-
     # Assuming the query will return one row with the count result
     if rows:
         total_offline = rows[0][0]
@@ -620,60 +764,64 @@ def get_stoppage_legend(
 
 #FETCH OFFLINE WTG API
 @app.get("/offline_wtgs")
-def get_offline_wtgs(db: pyodbc.Connection = Depends(get_db_access)):
-    cursor = db.cursor()
-    cursor.execute(
+@report("offline_wtgs", ttl=LIVE_REPORT_TTL_SECS)
+async def get_offline_wtgs(db: DbSession = Depends(get_access_session)):
+    columns, rows = await db.fetch_all(
         """
         SELECT 
             IIF(e.dtTS1DownBegin IS NOT NULL, e.dtTS1DownBegin, e.dtTS1EventBegin) AS EffectiveDownBegin,
-            f.facABBR, 
-            a.astDisplay, 
-            r.rtnName, 
-            rr.rsnName, 
+            e.facID, 
+            e.astID, 
+            e.rtnID, 
+            e.rsnID, 
             n.evntntNote,
             ROUND((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24, 2) AS DowntimeHrs
         FROM 
-            ((((tblEvent AS e
-            INNER JOIN tblFacility AS f ON e.facID = f.facID)
-            INNER JOIN tblAsset AS a ON e.astID = a.astID)
-            INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-            INNER JOIN tblReason as rr ON e.rsnID = rr.rsnID)
+            tblEvent AS e
             LEFT JOIN tblEventNotes as n ON e.evntID = n.evntID
         WHERE 
-            e.dtTS7EventFinish IS NULL
-        ORDER BY  
-            IIF(e.dtTS1DownBegin IS NOT NULL, e.dtTS1DownBegin, e.dtTS1EventBegin) DESC,
-            f.facABBR ASC,
-            a.astDisplay ASC;
-            
+            e.dtTS7EventFinish IS NULL;
         """
-        )  # Modify with your actual query
-    rows = cursor.fetchall()
-
-    # Extract the column names dynamically from the cursor description
-    columns = [column[0] for column in cursor.description]
-    
-    # Create a list of dictionaries with column names as keys
-    data = [dict(zip(columns, row)) for row in rows]
+        )
+    dims = await dimension_cache.get(db)
+
+    # Names come from the in-memory lookup tables (INNER JOINs drop unmatched rows)
+    data = []
+    for e in (dict(zip(columns, row)) for row in rows):
+        f = dims.row("tblFacility", e["facID"])
+        a = dims.row("tblAsset", e["astID"])
+        r = dims.row("tblRationale", e["rtnID"])
+        rr = dims.row("tblReason", e["rsnID"])
+        if f is None or a is None or r is None or rr is None:
+            continue
+        data.append({
+            "EffectiveDownBegin": e["EffectiveDownBegin"],
+            "facABBR": f["facABBR"],
+            "astDisplay": a["astDisplay"],
+            "rtnName": r["rtnName"],
+            "rsnName": rr["rsnName"],
+            "evntntNote": e["evntntNote"],
+            "DowntimeHrs": e["DowntimeHrs"],
+        })
+    data = sort_records(data, [("EffectiveDownBegin", True), ("facABBR", False), ("astDisplay", False)])
 
     return {"offlineWtgsDataSet": data}
 
 #FETCH SERVICES DATA FOR HEADING API
 @app.get("/services_details")
-def get_services_details(
+@report("services_details")
+async def get_services_details(
     startdate: str = Query(..., description="Start date in YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    db: DbSession = Depends(get_access_session)
 ):
-    cursor = db.cursor()
-
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-    cursor.execute(
+    row = await db.fetch_one(
         """
         SELECT 
             COUNT(IIf(r.rtnName NOT IN ('Fault', 'IDF Fault', 'IDF Outage', 'Communication'), 1, NULL)) AS total_services,
@@ -706,8 +854,6 @@ def get_services_details(
         (start_dt, end_dt)
     )
 
-    row = cursor.fetchone()
-
     if row:
         total_services = row[0]
         scheduled_services = row[1]
@@ -731,11 +877,11 @@ def get_services_details(
 
 #FETCH SERVICES API
 @app.get("/get_services")
+@report("get_services")
 async def get_services(
     startdate: str = Query(..., description="Start date in format YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in format YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access)):
-    cursor = db.cursor()
+    db: DbSession = Depends(get_access_session)):
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
@@ -743,64 +889,77 @@ async def get_services(
         return {"error": "Invalid date format. Use YYYY-MM-DD"}
     except ValueError:
         return {"error": "Invalid date format. Use YYYY-MM-DD"}
-    cursor.execute(
-        """
+    query = """
         SELECT 
             e.dtTS1DownBegin,  
             e.dtTS7DownFinish,
             ROUND((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24, 2) AS DowntimeHrs,
-            f.facABBR, 
-            a.astDisplay, 
-            r.rtnName, 
-            rr.rsnName, 
-            n.evntntNote
+            e.facID, 
+            e.astID, 
+            e.rtnID, 
+            e.rsnID, 
+            n.evntntNote,
+            IIF(e.dtTS7EventFinish IS NULL, 1, 0) AS IsOpen
         FROM 
-            ((((tblEvent AS e
-            INNER JOIN tblFacility AS f ON e.facID = f.facID)
-            INNER JOIN tblAsset AS a ON e.astID = a.astID)
-            INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-            LEFT JOIN tblReason as rr ON e.rsnID = rr.rsnID)
+            tblEvent AS e
             LEFT JOIN tblEventNotes as n ON e.evntID = n.evntID
         WHERE 
             e.dtTS1DownBegin BETWEEN ? AND ?
-            AND r.rtnName NOT IN ('Fault', 'IDF Outage', 'IDF Fault')
-            AND rr.rsnName <> 'Communication loss'
             AND (
                 n.evntntNote IS NULL OR n.evntntNote <> 'DELETED'
-                )
-        ORDER BY 
-            f.facABBR ASC,
-            e.dtTS1DownBegin DESC,
-            a.astDisplay DESC;
-        """,
-        (start_dt, end_dt)
-        )  # Modify with your actual query
-    rows = cursor.fetchall()
+                );
+        """
+    dims = await dimension_cache.get(db)
+
+    # Names come from the in-memory lookup tables (INNER JOINs drop unmatched rows)
+    def resolve(records):
+        data = []
+        for e in records:
+            f = dims.row("tblFacility", e["facID"])
+            a = dims.row("tblAsset", e["astID"])
+            r = dims.row("tblRationale", e["rtnID"])
+            if f is None or a is None or r is None:
+                continue
+            rsn_name = dims.value("tblReason", e["rsnID"], "rsnName")
+            if not text_not_in(r["rtnName"], ('Fault', 'IDF Outage', 'IDF Fault')):
+                continue
+            if rsn_name is None or same_text(rsn_name, 'Communication loss'):
+                continue
+            data.append({
+                "dtTS1DownBegin": e["dtTS1DownBegin"],
+                "dtTS7DownFinish": e["dtTS7DownFinish"],
+                "DowntimeHrs": e["DowntimeHrs"],
+                "facABBR": f["facABBR"],
+                "astDisplay": a["astDisplay"],
+                "rtnName": r["rtnName"],
+                "rsnName": rsn_name,
+                "evntntNote": e["evntntNote"],
+            })
+        return data
 
-    # Extract the column names dynamically from the cursor description
-    columns = [column[0] for column in cursor.description]
-    
-    # Create a list of dictionaries with column names as keys
-    data = [dict(zip(columns, row)) for row in rows]
+    # Rows come from per-day shards, so apply the ORDER BY here
+    data = sort_records(
+        await fetch_days(db, "get_services", query, start_dt, end_dt, transform=resolve),
+        [("facABBR", False), ("dtTS1DownBegin", True), ("astDisplay", True)],
+    )
 
     return {"servicesDataSet": data}
 
 #FETCH FAULTS DATA FOR HEADING API
 @app.get("/faults_details")
-def get_faults_details(
+@report("faults_details")
+async def get_faults_details(
     startdate: str = Query(..., description="Start date in YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    db: DbSession = Depends(get_access_session)
 ):
-    cursor = db.cursor()
-
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-    cursor.execute(
+    row = await db.fetch_one(
          """
             SELECT 
                 COUNT(*) AS total_faults,
@@ -824,8 +983,6 @@ def get_faults_details(
         (start_dt, end_dt)
     )
 
-    row = cursor.fetchone()
-
     if row:
         result = {
             "total_faults": row[0],
@@ -845,11 +1002,11 @@ def get_faults_details(
 
 #FETCH FAULTS API
 @app.get("/get_faults")
+@report("get_faults")
 async def get_faults(
     startdate: str = Query(..., description="Start date in format YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in format YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access)):
-    cursor = db.cursor()
+    db: DbSession = Depends(get_access_session)):
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
@@ -857,69 +1014,79 @@ async def get_faults(
         return {"error": "Invalid date format. Use YYYY-MM-DD"}
     except ValueError:
         return {"error": "Invalid date format. Use YYYY-MM-DD"}
-    cursor.execute(
-        """
+    query = """
         SELECT 
-            f.facABBR, 
-            a.astDisplay, 
-            r.rtnName, 
-            fa.fltCode,
-            fa.fltDesc,
+            e.facID, 
+            e.astID, 
+            e.rtnID, 
+            e.rsnID, 
+            e.fltID,
             e.dtTS1DownBegin,
             e.dtTS7DownFinish,
             ROUND((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24, 2) AS DowntimeHrs,
-            rrt.rsttypName AS ResetType,
-            rrb.rstbyName AS ResetBy,
-            n.evntntNote
+            e.rsttypID,
+            e.rstbyID,
+            n.evntntNote,
+            IIF(e.dtTS7EventFinish IS NULL, 1, 0) AS IsOpen
         FROM 
-            (((((((tblEvent AS e
-            INNER JOIN tblFacility AS f ON e.facID = f.facID)
-            INNER JOIN tblAsset AS a ON e.astID = a.astID)
-            INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-            INNER JOIN tblReason AS rr ON e.rsnID = rr.rsnID)
-            LEFT JOIN tblFaultCode AS fa ON e.fltID = fa.fltID)
-            LEFT JOIN tblRCCResetType AS rrt ON e.rsttypID = rrt.rsttypID)
-            LEFT JOIN tblRCCResetBy AS rrb ON e.rstbyID = rrb.rstbyID)
+            tblEvent AS e
             LEFT JOIN tblEventNotes AS n ON e.evntID = n.evntID
         WHERE 
-            r.rtnName = 'Fault' AND
             e.dtTS1DownBegin BETWEEN ? AND ? AND
             e.dtTS7DownFinish IS NOT NULL AND 
-            e.dtTS1DownBegin <> e.dtTS7DownFinish
-        ORDER BY 
-            ROUND((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24, 2) DESC,
-            f.facABBR ASC,
-            a.astDisplay ASC,
-            e.dtTS1DownBegin DESC;
-        """,
-        (start_dt, end_dt)
-        ) 
-    rows = cursor.fetchall()
+            e.dtTS1DownBegin <> e.dtTS7DownFinish;
+        """
+    dims = await dimension_cache.get(db)
+
+    # Names come from the in-memory lookup tables (INNER JOINs drop unmatched rows)
+    def resolve(records):
+        data = []
+        for e in records:
+            f = dims.row("tblFacility", e["facID"])
+            a = dims.row("tblAsset", e["astID"])
+            r = dims.row("tblRationale", e["rtnID"])
+            if f is None or a is None or r is None or dims.row("tblReason", e["rsnID"]) is None:
+                continue
+            if not same_text(r["rtnName"], 'Fault'):
+                continue
+            data.append({
+                "facABBR": f["facABBR"],
+                "astDisplay": a["astDisplay"],
+                "rtnName": r["rtnName"],
+                "fltCode": dims.value("tblFaultCode", e["fltID"], "fltCode"),
+                "fltDesc": dims.value("tblFaultCode", e["fltID"], "fltDesc"),
+                "dtTS1DownBegin": e["dtTS1DownBegin"],
+                "dtTS7DownFinish": e["dtTS7DownFinish"],
+                "DowntimeHrs": e["DowntimeHrs"],
+                "ResetType": dims.value("tblRCCResetType", e["rsttypID"], "rsttypName"),
+                "ResetBy": dims.value("tblRCCResetBy", e["rstbyID"], "rstbyName"),
+                "evntntNote": e["evntntNote"],
+            })
+        return data
 
-    # Extract the column names dynamically from the cursor description
-    columns = [column[0] for column in cursor.description]
-    
-    # Create a list of dictionaries with column names as keys
-    data = [dict(zip(columns, row)) for row in rows]
+    # Rows come from per-day shards, so apply the ORDER BY here
+    data = sort_records(
+        await fetch_days(db, "get_faults", query, start_dt, end_dt, transform=resolve),
+        [("DowntimeHrs", True), ("facABBR", False), ("astDisplay", False), ("dtTS1DownBegin", True)],
+    )
 
     return {"faultsDataSet": data}
 
 #FETCH IDF DATA FOR HEADINGS API
 @app.get("/idf_faults_heading")
-def get_idf_faults_heading(
+@report("idf_faults_heading")
+async def get_idf_faults_heading(
     startdate: str = Query(..., description="Start date in YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    db: DbSession = Depends(get_access_session)
 ):
-    cursor = db.cursor()
-
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-    cursor.execute(
+    columns, rows = await db.fetch_all(
         """
         SELECT 
             e.stpID,
@@ -935,8 +1102,6 @@ def get_idf_faults_heading(
         (start_dt, end_dt)
     )
 
-    rows = cursor.fetchall()
-
     restart_count = 0
     restart_reset_by_rcc = 0
     restart_total_downtime = 0.0
@@ -986,11 +1151,11 @@ def get_idf_faults_heading(
 
 #FETCH IDF DATA API
 @app.get("/get_idf")
+@report("get_idf")
 async def get_idf(
     startdate: str = Query(..., description="Start date in format YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in format YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_access)):
-    cursor = db.cursor()
+    db: DbSession = Depends(get_access_session)):
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
@@ -998,56 +1163,72 @@ async def get_idf(
         return {"error": "Invalid date format. Use YYYY-MM-DD"}
     except ValueError:
         return {"error": "Invalid date format. Use YYYY-MM-DD"}
-    cursor.execute(
-        """
+    query = """
         SELECT 
             e.dtTS1DownBegin, 
-            f.facABBR, 
-            a.astDisplay, 
-            r.rtnName, 
-            s.stpStopDesc,
+            e.facID, 
+            e.astID, 
+            e.rtnID, 
+            e.rsnID,
+            e.stpID,
             ROUND((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24, 2) AS DowntimeHrs,
-            rb.rstbyName,
+            e.rstbyID,
             ROUND((IIF(e.dtTS2RCCNotify IS NOT NULL, e.dtTS2RCCNotify, Now()) - e.dtTS1DownBegin) * 24 * 60, 2) AS ResponseTimeMins,
             ROUND(
                     IIF(
-                        r.rtnName = 'IDF Fault' AND 
-                        s.stpStopCode = 102 AND 
                         e.rstbyID = 2 AND 
                         ((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24) < 2,
                         2 - ((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24),
                         NULL
                     ),
                     2
-                ) AS IDFFaultTimeSaving,
-            n.evntntNote
+                ) AS RemoteResetSaving,
+            n.evntntNote,
+            IIF(e.dtTS7EventFinish IS NULL OR e.dtTS2RCCNotify IS NULL, 1, 0) AS IsOpen
         FROM 
-            ((((((tblEvent AS e
-            INNER JOIN tblFacility AS f ON e.facID = f.facID)
-            INNER JOIN tblAsset AS a ON e.astID = a.astID)
-            INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-            INNER JOIN tblReason as rr ON e.rsnID = rr.rsnID)
-            INNER JOIN tblStopCodes as s ON e.stpID = s.stpID)
-            INNER JOIN tblRCCResetBy as rb ON e.rstbyID = rb.rstbyID)
+            tblEvent AS e
             LEFT JOIN tblEventNotes as n ON e.evntID = n.evntID
         WHERE 
             e.dtTS1DownBegin BETWEEN ? AND ?
-            AND (r.rtnName = 'IDF Fault' OR rr.rsnName = 'IDF fault')
-            AND n.evntntNote <> 'DELETED'
-        ORDER BY 
-            e.dtTS1DownBegin DESC,
-            f.facABBR ASC,
-            a.astDisplay DESC;
-        """,
-        (start_dt, end_dt)
-        )  # Modify with your actual query
-    rows = cursor.fetchall()
+            AND n.evntntNote <> 'DELETED';
+        """
+    dims = await dimension_cache.get(db)
+
+    # Names come from the in-memory lookup tables (INNER JOINs drop unmatched rows)
+    def resolve(records):
+        data = []
+        for e in records:
+            f = dims.row("tblFacility", e["facID"])
+            a = dims.row("tblAsset", e["astID"])
+            r = dims.row("tblRationale", e["rtnID"])
+            rr = dims.row("tblReason", e["rsnID"])
+            s = dims.row("tblStopCodes", e["stpID"])
+            rb = dims.row("tblRCCResetBy", e["rstbyID"])
+            if f is None or a is None or r is None or rr is None or s is None or rb is None:
+                continue
+            if not (same_text(r["rtnName"], 'IDF Fault') or same_text(rr["rsnName"], 'IDF fault')):
+                continue
+            # Time saved by a remote reset only counts for IDF faults on stop code 102
+            is_idf_102 = same_text(r["rtnName"], 'IDF Fault') and s["stpStopCode"] == 102
+            data.append({
+                "dtTS1DownBegin": e["dtTS1DownBegin"],
+                "facABBR": f["facABBR"],
+                "astDisplay": a["astDisplay"],
+                "rtnName": r["rtnName"],
+                "stpStopDesc": s["stpStopDesc"],
+                "DowntimeHrs": e["DowntimeHrs"],
+                "rstbyName": rb["rstbyName"],
+                "ResponseTimeMins": e["ResponseTimeMins"],
+                "IDFFaultTimeSaving": e["RemoteResetSaving"] if is_idf_102 else None,
+                "evntntNote": e["evntntNote"],
+            })
+        return data
 
-    # Extract the column names dynamically from the cursor description
-    columns = [column[0] for column in cursor.description]
-    
-    # Create a list of dictionaries with column names as keys
-    data = [dict(zip(columns, row)) for row in rows]
+    # Rows come from per-day shards, so apply the ORDER BY here
+    data = sort_records(
+        await fetch_days(db, "get_idf", query, start_dt, end_dt, transform=resolve),
+        [("dtTS1DownBegin", True), ("facABBR", False), ("astDisplay", True)],
+    )
 
     return {"idfDataSet": data}
 
@@ -1100,12 +1281,12 @@ async def get_idf(
 #     return {"timesheetData": data}
 
 @app.get("/get_tidy_timesheet_pie_chart")
+@report("get_tidy_timesheet_pie_chart", sources=("fems",))
 async def get_tidy_timesheet_pie_chart(
     startdate: str = Query(..., description="Start date in format YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in format YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_fems)):
+    db: DbSession = Depends(get_fems_session)):
     
-    cursor = db.cursor()
     try:
         # Parse date strings to datetime objects
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
@@ -1113,99 +1294,69 @@ async def get_tidy_timesheet_pie_chart(
     except ValueError:
         return {"error": "Invalid date format. Use YYYY-MM-DD"}
     
-    # Query timesheet data
-    cursor.execute(
-        """
-        SELECT
-            service_center,
-            name,
-            worktype,
-            work_order_type,
-            start_time,
-            end_time
-        FROM 
-            tbl_timesheet
-        WHERE 
-            start_time BETWEEN ? AND ?
-        ORDER BY 
-            service_center ASC,
-            start_time DESC;
-        """, 
-        (start_dt, end_dt)
-    )
-    
-    rows = cursor.fetchall()
-    
-    # Extract column names dynamically
-    columns = [column[0] for column in cursor.description]
-    
-    # Map rows to dictionaries
-    data = [dict(zip(columns, row)) for row in rows]
-    
-    # Aggregate data for pie chart
-    from collections import defaultdict
-    
-    def calculate_duration_hours(start, end):
-        delta = end - start
-        return delta.total_seconds() / 3600
-
-    result = defaultdict(lambda: defaultdict(lambda: {"duration_hours": 0.0, "is_non_order": False}))
-
-    for entry in data:
-        service_center = entry["service_center"]
-        category = entry["worktype"] if entry["worktype"] != "0" else entry["work_order_type"]
-        is_non_order = category.startswith("0")
-        start_time = entry["start_time"]
-        end_time = entry["end_time"]
-        
-        # Some Access databases return datetime.datetime, while others return strings — handle both cases for compatibility:
-        if isinstance(start_time, str):
-            start_time = datetime.fromisoformat(start_time)
-        if isinstance(end_time, str):
-            end_time = datetime.fromisoformat(end_time)
-        
-        duration = calculate_duration_hours(start_time, end_time)
-        
-        result[service_center][category]["duration_hours"] += duration
-        result[service_center][category]["is_non_order"] = is_non_order  # store flag
-    
-    # Format result for frontend
-    charts = []
-    for sc, cat_map in result.items():
-        charts.append({
-            "service_center": sc,
-            "data": [
-                {
-                    "category": cat,
-                    "duration_hours": round(values["duration_hours"], 2),
-                    "is_non_order": values["is_non_order"]
-                }
-                for cat, values in cat_map.items()
-            ]
-        })
-    
-    return {"charts": charts}
+    # Seconds worked per service center and work type, summed by Access. Where the
+    # timestamps are text Access cannot convert (ISO "T" separator, fractional
+    # seconds) the query fails, and the rows are summed here as before instead
+    try:
+        _, rows = await db.fetch_all(
+            """
+            SELECT
+                service_center,
+                worktype,
+                work_order_type,
+                SUM(DateDiff('s', start_time, end_time)) AS duration_secs
+            FROM 
+                tbl_timesheet
+            WHERE 
+                start_time BETWEEN ? AND ?
+            GROUP BY
+                service_center, worktype, work_order_type;
+            """, 
+            (start_dt, end_dt)
+        )
+        durations = [
+            (service_center, worktype, work_order_type, float(duration_secs or 0) / 3600)
+            for service_center, worktype, work_order_type, duration_secs in rows
+        ]
+    except pyodbc.Error:
+        _, rows = await db.fetch_all(
+            """
+            SELECT
+                service_center,
+                worktype,
+                work_order_type,
+                start_time,
+                end_time
+            FROM 
+                tbl_timesheet
+            WHERE 
+                start_time BETWEEN ? AND ?;
+            """, 
+            (start_dt, end_dt)
+        )
+        durations = [
+            (service_center, worktype, work_order_type, timesheet_hours(start_time, end_time))
+            for service_center, worktype, work_order_type, start_time, end_time in rows
+        ]
 
+    return {"charts": timesheet_charts(durations)}
 
 
 #----------------------------------------------Analysis Report------------------------------------------------------------------
 # POWER PRODUCTION ANALYSIS API
 @app.get("/get_production_analysis")
+@report("get_production_analysis", sources=("access", "prod_stats"))
 async def get_production_analysis(
+    request: Request,
     startdate1: str = Query(...),
     enddate1: str = Query(...),
     startdate2: str = Query(...),
-    enddate2: str = Query(...),
-    db_access: pyodbc.Connection = Depends(get_db_access),
-    db_prod_stats: pyodbc.Connection = Depends(get_db_prod_stats)
+    enddate2: str = Query(...)
 ):
-    cursor_access = db_access.cursor()
-    cursor_prod_stats = db_prod_stats.cursor()
-
     def parse_date(d):
         return datetime.strptime(d, "%Y-%m-%d")
 
-    def run_queries(start_dt, end_dt, period_id):
+    async def run_queries(start_dt, end_dt, period_id):
         # Adjust range end
         end_dt = end_dt + timedelta(days=1) - timedelta(seconds=1)
 
@@ -1237,27 +1388,37 @@ async def get_production_analysis(
         GROUP BY DatePart('ww', CDate(tblStatsProd.spDate)), tblFacility.facABBR
         """
 
-        cursor_access.execute(query_1, (start_dt, end_dt))
-        rows_1 = cursor_access.fetchall()
-        cursor_prod_stats.execute(query_2, (start_dt, end_dt))
-        rows_2 = cursor_prod_stats.fetchall()
-
-        columns_1 = [column[0] for column in cursor_access.description]
-        columns_2 = [column[0] for column in cursor_prod_stats.description]
+        # Downtime (RCC database) and power stats (Prod Stats database) are separate
+        # files: fetch both at once, each period on its own connections
+        (columns_1, rows_1), (columns_2, rows_2) = await gather_queries(
+            fetch_from("access", query_1, (start_dt, end_dt), request),
+            fetch_from("prod_stats", query_2, (start_dt, end_dt), request),
+        )
 
         data_1 = [dict(zip(columns_1, row)) for row in rows_1]
         data_2 = [dict(zip(columns_2, row)) for row in rows_2]
 
+        # Hash join on (weeknum, facABBR); the first power row wins, as the old scan did
+        power_by_week = {}
+        for row_2 in data_2:
+            power_by_week.setdefault((row_2['weeknum'], row_2['facABBR']), row_2)
+
         combined_data = []
+        matched = set()
 
         for row_1 in data_1:
-            match = next(
-                (row_2 for row_2 in data_2 if row_2['weeknum'] == row_1['weeknum'] and row_2['facABBR'] == row_1['facABBR']),
-                None
-            )
+            key = (row_1['weeknum'], row_1['facABBR'])
+            match = power_by_week.get(key)
+            if match is not None:
+                matched.add(key)
             merged = {**row_1, **(match or {}), "period": period_id}
             combined_data.append(merged)
 
+        # Weeks with power data but no events still belong in the comparison
+        for key, row_2 in power_by_week.items():
+            if key not in matched:
+                combined_data.append({**row_2, "totalEntries": 0, "DowntimeHrs": 0, "period": period_id})
+
         return combined_data
 
     # Run for both time periods
@@ -1266,88 +1427,84 @@ async def get_production_analysis(
     dt2_start = parse_date(startdate2)
     dt2_end = parse_date(enddate2)
 
-    result1 = run_queries(dt1_start, dt1_end, 'Period 1')
-    result2 = run_queries(dt2_start, dt2_end, 'Period 2')
+    result1, result2 = await gather_queries(
+        run_queries(dt1_start, dt1_end, 'Period 1'),
+        run_queries(dt2_start, dt2_end, 'Period 2'),
+    )
 
     return {"productionAnalysisDataSet": result1 + result2}
 
 #SCHEDULED SERVICE ANALYSIS API
 @app.get("/get_schedule_service_analysis")
-def get_schedule_service_analysis(
+@report("get_schedule_service_analysis")
+async def get_schedule_service_analysis(
+    request: Request,
     startdate1: str = Query(..., description="Start date for Period 1 (YYYY-MM-DD)"),
     enddate1: str = Query(..., description="End date for Period 1 (YYYY-MM-DD)"),
     startdate2: str = Query(..., description="Start date for Period 2 (YYYY-MM-DD)"),
-    enddate2: str = Query(..., description="End date for Period 2 (YYYY-MM-DD)"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    enddate2: str = Query(..., description="End date for Period 2 (YYYY-MM-DD)")
 ):
-    def run_query(start, end, period):
+    async def run_query(start, end, period):
         try:
             start_dt = datetime.strptime(start, "%Y-%m-%d")
             end_dt = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format")
 
-        cursor = db.cursor()
-        cursor.execute(
-            """
-            SELECT  
-                f.facABBR,
-                a.astDisplay,  
-                r.rtnName,
-                rr.rsnName,
-                ROUND(SUM(
-                    IIF(e.dtTS7DownFinish IS NOT NULL, 
-                        (e.dtTS7DownFinish - e.dtTS1DownBegin) * 24, 
-                        (Now() - e.dtTS1DownBegin) * 24
-                    )
-                ), 2) AS total_downtime_hrs,
-                e.dtTS1DownBegin
-            FROM 
-                ((((tblEvent AS e
-                INNER JOIN tblFacility AS f ON e.facID = f.facID)
-                INNER JOIN tblAsset AS a ON e.astID = a.astID)
-                INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-                LEFT JOIN tblReason as rr ON e.rsnID = rr.rsnID)
-                LEFT JOIN tblEventNotes as n ON e.evntID = n.evntID
-            WHERE 
-                e.dtTS1DownBegin BETWEEN ? AND ?
-                AND r.rtnName = 'Schedule Service'
-            GROUP BY
-                f.facABBR, a.astDisplay, r.rtnName, rr.rsnName, e.dtTS1DownBegin
-            ORDER BY 
-                f.facABBR ASC
-            """,
-            (start_dt, end_dt)
-        )
+        async with open_session("access", request) as db:
+            columns, rows = await db.fetch_all(
+                """
+                SELECT  
+                    f.facABBR,
+                    a.astDisplay,  
+                    r.rtnName,
+                    rr.rsnName,
+                    COUNT(*) AS events,
+                    SUM(ROUND(
+                        IIF(e.dtTS7DownFinish IS NOT NULL, 
+                            (e.dtTS7DownFinish - e.dtTS1DownBegin) * 24, 
+                            (Now() - e.dtTS1DownBegin) * 24
+                        )
+                    , 2)) AS total_downtime_hrs,
+                    DateAdd('d', 1 - Weekday(e.dtTS1DownBegin, 2), DateValue(e.dtTS1DownBegin)) AS week_start
+                FROM 
+                    (((tblEvent AS e
+                    INNER JOIN tblFacility AS f ON e.facID = f.facID)
+                    INNER JOIN tblAsset AS a ON e.astID = a.astID)
+                    INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
+                    LEFT JOIN tblReason as rr ON e.rsnID = rr.rsnID
+                WHERE 
+                    e.dtTS1DownBegin BETWEEN ? AND ?
+                    AND r.rtnName = 'Schedule Service'
+                GROUP BY
+                    f.facABBR, a.astDisplay, r.rtnName, rr.rsnName,
+                    DateAdd('d', 1 - Weekday(e.dtTS1DownBegin, 2), DateValue(e.dtTS1DownBegin))
+                ORDER BY 
+                    f.facABBR ASC
+                """,
+                (start_dt, end_dt)
+            )
 
+        # Access buckets by ISO week (Monday start); one row per week and group
         temp_data = defaultdict(lambda: {
             "count": 0,
             "total_downtime_hrs": 0.0,
-            "week_number": None
         })
 
-        for row in cursor.fetchall():
+        for row in rows:
             wind_farm = row[0]
             wtg = row[1]
             rtn_name = row[2]
             rsn_name = row[3]
-            downtime = float(row[4]) if row[4] is not None else 0.0
-            down_begin = row[5]
+            downtime = float(row[5]) if row[5] is not None else 0.0
+            week_number = row[6].isocalendar().week if row[6] is not None else None
 
-            try:
-                if isinstance(down_begin, str):
-                    down_begin = datetime.fromisoformat(down_begin)
-                week_number = down_begin.isocalendar().week
-            except Exception:
-                week_number = None
-
-            key = (period, wind_farm, wtg, rtn_name, rsn_name)
-            temp_data[key]["count"] += 1
+            key = (period, wind_farm, wtg, rtn_name, rsn_name, week_number)
+            temp_data[key]["count"] += row[4]
             temp_data[key]["total_downtime_hrs"] += downtime
-            temp_data[key]["week_number"] = week_number
 
         result = []
-        for (period, wind_farm, wtg, rtn_name, rsn_name), values in temp_data.items():
+        for (period, wind_farm, wtg, rtn_name, rsn_name, week_number), values in temp_data.items():
             count = values["count"]
             total_downtime = values["total_downtime_hrs"]
             avg_downtime = round(total_downtime / count, 2) if count > 0 else 0.0
@@ -1361,13 +1518,17 @@ def get_schedule_service_analysis(
                 "count": count,
                 "avg_downtime_hrs": avg_downtime,
                 "total_downtime_hrs": round(total_downtime, 2),
-                "week_number": values["week_number"]
+                "week_number": week_number
             })
 
         return result
 
-    results = run_query(startdate1, enddate1, 'period 1') + run_query(startdate2, enddate2, 'period 2')
-    results.sort(key=lambda x: (x["wind_farm"], x["wtg"], x["rtn_name"], x["rsn_name"]))  # Sort by wind farm and more
+    period1_results, period2_results = await gather_queries(
+        run_query(startdate1, enddate1, 'period 1'),
+        run_query(startdate2, enddate2, 'period 2'),
+    )
+    results = period1_results + period2_results
+    results.sort(key=lambda x: (x["wind_farm"], x["wtg"], x["rtn_name"], x["rsn_name"], x["week_number"]))  # Sort by wind farm and more
 
 
     return {
@@ -1376,65 +1537,61 @@ def get_schedule_service_analysis(
 
 #NON SCHEDULED SERVICE ANALYSIS API
 @app.get("/get_service_analysis")
-def get_service_analysis(
+@report("get_service_analysis")
+async def get_service_analysis(
+    request: Request,
     startdate1: str = Query(..., description="Start date for Period 1 (YYYY-MM-DD)"),
     enddate1: str = Query(..., description="End date for Period 1 (YYYY-MM-DD)"),
     startdate2: str = Query(..., description="Start date for Period 2 (YYYY-MM-DD)"),
-    enddate2: str = Query(..., description="End date for Period 2 (YYYY-MM-DD)"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    enddate2: str = Query(..., description="End date for Period 2 (YYYY-MM-DD)")
 ):
-    def run_query(start, end, period):
+    async def run_query(start, end, period):
         try:
             start_dt = datetime.strptime(start, "%Y-%m-%d")
             end_dt = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format")
 
-        cursor = db.cursor()
-        cursor.execute(
-            """
-            SELECT  
-                f.facABBR,  
-                r.rtnName, 
-                COUNT(*) AS frequency,
-                ROUND(SUM(
-                    IIF(e.dtTS7DownFinish IS NOT NULL, 
-                        (e.dtTS7DownFinish - e.dtTS1DownBegin) * 24, 
-                        (Now() - e.dtTS1DownBegin) * 24
-                    )
-                ), 2) AS total_downtime_hrs,
-                e.dtTS1DownBegin
-            FROM 
-                ((((tblEvent AS e
-                INNER JOIN tblFacility AS f ON e.facID = f.facID)
-                INNER JOIN tblAsset AS a ON e.astID = a.astID)
-                INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-                LEFT JOIN tblReason as rr ON e.rsnID = rr.rsnID)
-                LEFT JOIN tblEventNotes as n ON e.evntID = n.evntID
-            WHERE 
-                e.dtTS1DownBegin BETWEEN ? AND ?
-                AND r.rtnName NOT IN ('Fault', 'IDF Outage', 'Other', 'IDF Fault', 'Schedule Service', 'Schedule Outage')
-                AND rr.rsnName <> 'Communication loss'
-                AND n.evntntNote <> 'DELETED'
-            GROUP BY
-                f.facABBR, r.rtnName, e.dtTS1DownBegin
-            ORDER BY 
-                f.facABBR ASC,
-                COUNT(*) DESC
-            """,
-            (start_dt, end_dt)
-        )
+        async with open_session("access", request) as db:
+            columns, rows = await db.fetch_all(
+                """
+                SELECT  
+                    f.facABBR,  
+                    r.rtnName, 
+                    COUNT(*) AS frequency,
+                    SUM(ROUND(
+                        IIF(e.dtTS7DownFinish IS NOT NULL, 
+                            (e.dtTS7DownFinish - e.dtTS1DownBegin) * 24, 
+                            (Now() - e.dtTS1DownBegin) * 24
+                        )
+                    , 2)) AS total_downtime_hrs,
+                    DateAdd('d', 1 - Weekday(e.dtTS1DownBegin, 2), DateValue(e.dtTS1DownBegin)) AS week_start
+                FROM 
+                    ((((tblEvent AS e
+                    INNER JOIN tblFacility AS f ON e.facID = f.facID)
+                    INNER JOIN tblAsset AS a ON e.astID = a.astID)
+                    INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
+                    LEFT JOIN tblReason as rr ON e.rsnID = rr.rsnID)
+                    LEFT JOIN tblEventNotes as n ON e.evntID = n.evntID
+                WHERE 
+                    e.dtTS1DownBegin BETWEEN ? AND ?
+                    AND r.rtnName NOT IN ('Fault', 'IDF Outage', 'Other', 'IDF Fault', 'Schedule Service', 'Schedule Outage')
+                    AND rr.rsnName <> 'Communication loss'
+                    AND n.evntntNote <> 'DELETED'
+                GROUP BY
+                    f.facABBR, r.rtnName,
+                    DateAdd('d', 1 - Weekday(e.dtTS1DownBegin, 2), DateValue(e.dtTS1DownBegin))
+                ORDER BY 
+                    f.facABBR ASC,
+                    COUNT(*) DESC
+                """,
+                (start_dt, end_dt)
+            )
 
-        rows = cursor.fetchall()
+        # Access buckets by ISO week (Monday start), so there is one row per week and group
         result = []
         for row in rows:
-            down_begin = row[4]
-            try:
-                if isinstance(down_begin, str):
-                    down_begin = datetime.fromisoformat(down_begin)
-                week_number = down_begin.isocalendar().week
-            except Exception:
-                week_number = None
+            week_number = row[4].isocalendar().week if row[4] is not None else None
 
             # Add each result to the final list
             result.append({
@@ -1448,7 +1605,11 @@ def get_service_analysis(
         return result
 
     # Run queries for both date ranges and merge the results
-    results = run_query(startdate1, enddate1, 'period 1') + run_query(startdate2, enddate2, 'period 2')
+    period1_results, period2_results = await gather_queries(
+        run_query(startdate1, enddate1, 'period 1'),
+        run_query(startdate2, enddate2, 'period 2'),
+    )
+    results = period1_results + period2_results
 
     # Now, combine the results by week_number, wind_farm, and rationale
     combined_results = {}
@@ -1480,15 +1641,16 @@ def get_service_analysis(
 
 #TOP 10 FAULT ANALYSIS API
 @app.get("/top_ten_faults")
-def get_top_ten_faults(
+@report("top_ten_faults")
+async def get_top_ten_faults(
+    request: Request,
     startdate1: str = Query(..., description="Start date for Period 1 YYYY-MM-DD"),
     enddate1: str = Query(..., description="End date for Period 1 YYYY-MM-DD"),
     startdate2: str = Query(..., description="Start date for Period 2 YYYY-MM-DD"),
     enddate2: str = Query(..., description="End date for Period 2 YYYY-MM-DD"),
-    sort_by: str = Query("downtime", description="Sort by 'downtime' or 'frequency'"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    sort_by: str = Query("downtime", description="Sort by 'downtime' or 'frequency'")
 ):
-    def run_query(start, end, sort_by):
+    async def run_query(start, end, sort_by):
         try:
             start_dt = datetime.strptime(start, "%Y-%m-%d")
             end_dt = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
@@ -1509,38 +1671,36 @@ def get_top_ten_faults(
         else:
             raise HTTPException(status_code=400, detail="Invalid sort_by value. Use 'downtime' or 'frequency'.")
 
-        cursor = db.cursor()
-        cursor.execute(
-            f"""
-            SELECT 
-                TOP 10
-                fa.fltCode, 
-                fa.fltDesc, 
-                COUNT(*) AS frequency,
-                SUM(
-                    IIF(e.dtTS7DownFinish IS NOT NULL, 
-                        (e.dtTS7DownFinish - e.dtTS1DownBegin) * 24, 
-                        (Now() - e.dtTS1DownBegin) * 24
-                    )
-                ) AS total_downtime_hrs,
-                MIN(e.dtTS1DownBegin) AS first_occurrence
-            FROM 
-                (tblEvent AS e
-                INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-                INNER JOIN tblFaultCode AS fa ON e.fltID = fa.fltID
-            WHERE 
-                r.rtnName = 'Fault'
-                AND e.dtTS1DownBegin BETWEEN ? AND ?
-            GROUP BY 
-                fa.fltCode, fa.fltDesc
-            ORDER BY 
-                {order_by},
-                MIN(e.dtTS1DownBegin) ASC
-            """,
-            (start_dt, end_dt)
-        )
-
-        rows = cursor.fetchall()
+        async with open_session("access", request) as db:
+            columns, rows = await db.fetch_all(
+                f"""
+                SELECT 
+                    TOP 10
+                    fa.fltCode, 
+                    fa.fltDesc, 
+                    COUNT(*) AS frequency,
+                    SUM(
+                        IIF(e.dtTS7DownFinish IS NOT NULL, 
+                            (e.dtTS7DownFinish - e.dtTS1DownBegin) * 24, 
+                            (Now() - e.dtTS1DownBegin) * 24
+                        )
+                    ) AS total_downtime_hrs,
+                    MIN(e.dtTS1DownBegin) AS first_occurrence
+                FROM 
+                    (tblEvent AS e
+                    INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
+                    INNER JOIN tblFaultCode AS fa ON e.fltID = fa.fltID
+                WHERE 
+                    r.rtnName = 'Fault'
+                    AND e.dtTS1DownBegin BETWEEN ? AND ?
+                GROUP BY 
+                    fa.fltCode, fa.fltDesc
+                ORDER BY 
+                    {order_by},
+                    MIN(e.dtTS1DownBegin) ASC
+                """,
+                (start_dt, end_dt)
+            )
 
         result = []
         for row in rows:
@@ -1553,8 +1713,10 @@ def get_top_ten_faults(
 
         return result
 
-    period1_results = run_query(startdate1, enddate1, sort_by)
-    period2_results = run_query(startdate2, enddate2, sort_by)
+    period1_results, period2_results = await gather_queries(
+        run_query(startdate1, enddate1, sort_by),
+        run_query(startdate2, enddate2, sort_by),
+    )
 
     return {
         "period1": period1_results,
@@ -1563,17 +1725,17 @@ def get_top_ten_faults(
 
 #GET PROD STATS FROM WIDN FARM API
 @app.get("/prod_stats_by_site")
-def get_prod_stats_by_site(
+@report("prod_stats_by_site", sources=("prod_stats",))
+async def get_prod_stats_by_site(
     facid: int = Query(..., description="Facility ID (e.g. 8 for SYHWF)"),
     startdate: str = Query(..., description="Start date in YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in YYYY-MM-DD"),
-    db: pyodbc.Connection = Depends(get_db_prod_stats)
+    db: DbSession = Depends(get_prod_stats_session)
 ):
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d")
 
-        cursor = db.cursor()
         date_column = 'spDate'
 
         sql = f"""
@@ -1584,8 +1746,7 @@ def get_prod_stats_by_site(
               AND [{date_column}] BETWEEN ? AND ?
         """
 
-        cursor.execute(sql, (facid, start_dt, end_dt))
-        row = cursor.fetchone()
+        row = await db.fetch_one(sql, (facid, start_dt, end_dt))
 
         if not row or row[0] is None:
             return {
@@ -1603,189 +1764,197 @@ def get_prod_stats_by_site(
 
 #GET OFFLINE WTG FOR WIND FARM API
 @app.get("/offline_wtgs_for_wf")
-def get_offline_wtgs_for_wf(
+@report("offline_wtgs_for_wf", ttl=LIVE_REPORT_TTL_SECS)
+async def get_offline_wtgs_for_wf(
     windfarm: str = Query(default=None, description="Filter by wind farm abbreviation"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    db: DbSession = Depends(get_access_session)
  ):
-    cursor = db.cursor()
 
-    # Build dynamic WHERE clause based on windfarm filter
-    query = """
+    columns, rows = await db.fetch_all(
+        """
         SELECT 
             e.dtTS1DownBegin, 
-            f.facABBR, 
-            a.astDisplay, 
-            r.rtnName, 
-            rr.rsnName, 
+            e.facID, 
+            e.astID, 
+            e.rtnID, 
+            e.rsnID, 
             n.evntntNote,
             ROUND((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24, 2) AS DowntimeHrs
         FROM 
-            ((((tblEvent AS e
-            INNER JOIN tblFacility AS f ON e.facID = f.facID)
-            INNER JOIN tblAsset AS a ON e.astID = a.astID)
-            INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-            INNER JOIN tblReason as rr ON e.rsnID = rr.rsnID)
+            tblEvent AS e
             LEFT JOIN tblEventNotes as n ON e.evntID = n.evntID
         WHERE 
             e.dtTS7EventFinish IS NULL
             AND n.evntntNote <> 'DELETED'
-    """
-
-    params = []
-
-    if windfarm:
-        query += " AND f.facABBR = ?"
-        params.append(windfarm)
-
-    query += """
-        ORDER BY 
-            e.dtTS1DownBegin DESC,
-            f.facABBR ASC,
-            a.astDisplay DESC
-    """
-
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-
-    # Extract column names
-    columns = [column[0] for column in cursor.description]
-    data = [dict(zip(columns, row)) for row in rows]
+        """
+        )
+    dims = await dimension_cache.get(db)
+
+    # Names come from the in-memory lookup tables (INNER JOINs drop unmatched rows)
+    data = []
+    for e in (dict(zip(columns, row)) for row in rows):
+        f = dims.row("tblFacility", e["facID"])
+        a = dims.row("tblAsset", e["astID"])
+        r = dims.row("tblRationale", e["rtnID"])
+        rr = dims.row("tblReason", e["rsnID"])
+        if f is None or a is None or r is None or rr is None:
+            continue
+        if windfarm and not same_text(f["facABBR"], windfarm):
+            continue
+        data.append({
+            "dtTS1DownBegin": e["dtTS1DownBegin"],
+            "facABBR": f["facABBR"],
+            "astDisplay": a["astDisplay"],
+            "rtnName": r["rtnName"],
+            "rsnName": rr["rsnName"],
+            "evntntNote": e["evntntNote"],
+            "DowntimeHrs": e["DowntimeHrs"],
+        })
+    data = sort_records(data, [("dtTS1DownBegin", True), ("facABBR", False), ("astDisplay", True)])
 
     return {"offlineWtgsWFDataSet": data}
 
 #GET STOPPAGES FOR WIND FARM API
 @app.get("/get_stoppages_for_wf")
+@report("get_stoppages_for_wf")
 async def get_services(
     startdate: str = Query(..., description="Start date in format YYYY-MM-DD"),
     enddate: str = Query(..., description="End date in format YYYY-MM-DD"),
     windfarm: str = Query(None, description="Wind farm abbreviation (optional)"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    db: DbSession = Depends(get_access_session)
 ):
-    cursor = db.cursor()
     try:
         start_dt = datetime.strptime(startdate, "%Y-%m-%d")
         end_dt = datetime.strptime(enddate, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
     except ValueError:
         return {"error": "Invalid date format. Use YYYY-MM-DD"}
     
-    # Build the query dynamically based on the presence of the windfarm filter
     query = """
     SELECT 
-        f.facABBR, 
-        a.astDisplay, 
+        e.facID, 
+        e.astID, 
         e.evntWindSpeed,
-        r.rtnName, 
-        rr.rsnName, 
-        s.stpStopCode,
-        s.stpStopDesc,
-        fa.fltCode,
-        fa.fltDesc,
+        e.rtnID, 
+        e.rsnID, 
+        e.stpID,
+        e.fltID,
         ROUND((IIF(e.dtTS7DownFinish IS NOT NULL, e.dtTS7DownFinish, Now()) - e.dtTS1DownBegin) * 24, 2) AS DowntimeHrs,
         e.dtTS1DownBegin, 
         e.dtTS2RCCNotify,
         e.dtTS7DownFinish,
         e.dtTS3MaintBegin,
-        rt.rsttypName,
-        rb.rstbyName,
-        n.evntntNote
+        e.rsttypID,
+        e.rstbyID,
+        n.evntntNote,
+        IIF(e.dtTS7DownFinish IS NULL, 1, 0) AS IsOpen
     FROM 
-        ((((((((tblEvent AS e
-        INNER JOIN tblFacility AS f ON e.facID = f.facID)
-        INNER JOIN tblAsset AS a ON e.astID = a.astID)
-        LEFT JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-        INNER JOIN tblReason as rr ON e.rsnID = rr.rsnID)
-        INNER JOIN tblStopCodes as s ON e.stpID = s.stpID)
-        LEFT JOIN tblFaultCode as fa ON e.fltID = fa.fltID)
-        LEFT JOIN tblRCCResetType as rt ON e.rsttypID = rt.rsttypID)
-        LEFT JOIN tblRCCResetBy as rb ON e.rstbyID = rb.rstbyID)
+        tblEvent AS e
         LEFT JOIN tblEventNotes as n ON e.evntID = n.evntID
     WHERE
         e.dtTS1DownBegin BETWEEN ? AND ?
         AND (n.evntntNote <> 'DELETED' OR n.evntntNote IS NULL OR n.evntntNote = '')
     """
-    
-    # If a windfarm is provided, add it as a filter in the query
-    if windfarm:
-        query += " AND f.facABBR = ?"
-    
-    # Execute the query, passing the appropriate parameters
-    if windfarm:
-        cursor.execute(query, (start_dt, end_dt, windfarm))
-    else:
-        cursor.execute(query, (start_dt, end_dt))
-    
-    rows = cursor.fetchall()
+    dims = await dimension_cache.get(db)
+
+    # Names come from the in-memory lookup tables (INNER JOINs drop unmatched rows)
+    def resolve(records):
+        data = []
+        for e in records:
+            f = dims.row("tblFacility", e["facID"])
+            a = dims.row("tblAsset", e["astID"])
+            rr = dims.row("tblReason", e["rsnID"])
+            s = dims.row("tblStopCodes", e["stpID"])
+            if f is None or a is None or rr is None or s is None:
+                continue
+            data.append({
+                "facABBR": f["facABBR"],
+                "astDisplay": a["astDisplay"],
+                "evntWindSpeed": e["evntWindSpeed"],
+                "rtnName": dims.value("tblRationale", e["rtnID"], "rtnName"),
+                "rsnName": rr["rsnName"],
+                "stpStopCode": s["stpStopCode"],
+                "stpStopDesc": s["stpStopDesc"],
+                "fltCode": dims.value("tblFaultCode", e["fltID"], "fltCode"),
+                "fltDesc": dims.value("tblFaultCode", e["fltID"], "fltDesc"),
+                "DowntimeHrs": e["DowntimeHrs"],
+                "dtTS1DownBegin": e["dtTS1DownBegin"],
+                "dtTS2RCCNotify": e["dtTS2RCCNotify"],
+                "dtTS7DownFinish": e["dtTS7DownFinish"],
+                "dtTS3MaintBegin": e["dtTS3MaintBegin"],
+                "rsttypName": dims.value("tblRCCResetType", e["rsttypID"], "rsttypName"),
+                "rstbyName": dims.value("tblRCCResetBy", e["rstbyID"], "rstbyName"),
+                "evntntNote": e["evntntNote"],
+            })
+        return data
 
-    # Extract the column names dynamically from the cursor description
-    columns = [column[0] for column in cursor.description]
-    
-    # Create a list of dictionaries with column names as keys
-    data = [dict(zip(columns, row)) for row in rows]
+    # All wind farms share the day shards; the windfarm filter is applied afterwards
+    data = await fetch_days(db, "get_stoppages_for_wf", query, start_dt, end_dt, transform=resolve)
+    if windfarm:
+        data = [row for row in data if same_text(row["facABBR"], windfarm)]
 
     return {"stoppagesDataSet": data}
 
 #IDF ANALYSIS API
 @app.get("/get_idf_analysis")
+@report("get_idf_analysis")
 async def get_idf_analysis(
+    request: Request,
     startdate1: str = Query(..., description="Start date for Period 1 (YYYY-MM-DD)"),
     enddate1: str = Query(..., description="End date for Period 1 (YYYY-MM-DD)"),
     startdate2: str = Query(..., description="Start date for Period 2 (YYYY-MM-DD)"),
-    enddate2: str = Query(..., description="End date for Period 2 (YYYY-MM-DD)"),
-    db: pyodbc.Connection = Depends(get_db_access)
+    enddate2: str = Query(..., description="End date for Period 2 (YYYY-MM-DD)")
 ):
-    def run_query(start, end, period):
+    async def run_query(start, end, period):
         try:
             start_dt = datetime.strptime(start, "%Y-%m-%d")
             end_dt = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format")
 
-        cursor = db.cursor()
-        cursor.execute(
-            """
-            SELECT 
-                e.dtTS1DownBegin,              
-                e.dtTS7DownFinish,
-                f.facABBR, 
-                a.astDisplay, 
-                r.rtnName, 
-                s.stpStopDesc,
-                ROUND((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24, 2) AS DowntimeHrs,
-                rb.rstbyName,
-                ROUND((IIF(e.dtTS2RCCNotify IS NOT NULL, e.dtTS2RCCNotify, Now()) - e.dtTS1DownBegin) * 24 * 60, 2) AS ResponseTimeMins,
-                ROUND(
-                    IIF(
-                        r.rtnName = 'IDF Fault' AND 
-                        s.stpStopCode = 102 AND 
-                        e.rstbyID = 2 AND 
-                        ((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24) < 2,
-                        2 - ((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24),
-                        NULL
-                    ),
-                    2
-                ) AS IDFFaultTimeSaving,
-                n.evntntNote
-            FROM 
-                ((((((tblEvent AS e
-                INNER JOIN tblFacility AS f ON e.facID = f.facID)
-                INNER JOIN tblAsset AS a ON e.astID = a.astID)
-                INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
-                INNER JOIN tblReason as rr ON e.rsnID = rr.rsnID)
-                INNER JOIN tblStopCodes as s ON e.stpID = s.stpID)
-                INNER JOIN tblRCCResetBy as rb ON e.rstbyID = rb.rstbyID)
-                LEFT JOIN tblEventNotes as n ON e.evntID = n.evntID
-            WHERE 
-                e.dtTS1DownBegin BETWEEN ? AND ?
-                AND (r.rtnName = 'IDF Fault' OR rr.rsnName = 'IDF fault')
-                AND n.evntntNote <> 'DELETED'
-            ORDER BY 
-                a.astDisplay DESC;
-            """,
-            (start_dt, end_dt)
-        )
+        async with open_session("access", request) as db:
+            columns, rows = await db.fetch_all(
+                """
+                SELECT 
+                    e.dtTS1DownBegin,              
+                    e.dtTS7DownFinish,
+                    f.facABBR, 
+                    a.astDisplay, 
+                    r.rtnName, 
+                    s.stpStopDesc,
+                    ROUND((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24, 2) AS DowntimeHrs,
+                    rb.rstbyName,
+                    ROUND((IIF(e.dtTS2RCCNotify IS NOT NULL, e.dtTS2RCCNotify, Now()) - e.dtTS1DownBegin) * 24 * 60, 2) AS ResponseTimeMins,
+                    ROUND(
+                        IIF(
+                            r.rtnName = 'IDF Fault' AND 
+                            s.stpStopCode = 102 AND 
+                            e.rstbyID = 2 AND 
+                            ((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24) < 2,
+                            2 - ((IIF(e.dtTS7EventFinish IS NOT NULL, e.dtTS7EventFinish, Now()) - e.dtTS1DownBegin) * 24),
+                            NULL
+                        ),
+                        2
+                    ) AS IDFFaultTimeSaving,
+                    n.evntntNote
+                FROM 
+                    ((((((tblEvent AS e
+                    INNER JOIN tblFacility AS f ON e.facID = f.facID)
+                    INNER JOIN tblAsset AS a ON e.astID = a.astID)
+                    INNER JOIN tblRationale AS r ON e.rtnID = r.rtnID)
+                    INNER JOIN tblReason as rr ON e.rsnID = rr.rsnID)
+                    INNER JOIN tblStopCodes as s ON e.stpID = s.stpID)
+                    INNER JOIN tblRCCResetBy as rb ON e.rstbyID = rb.rstbyID)
+                    LEFT JOIN tblEventNotes as n ON e.evntID = n.evntID
+                WHERE 
+                    e.dtTS1DownBegin BETWEEN ? AND ?
+                    AND (r.rtnName = 'IDF Fault' OR rr.rsnName = 'IDF fault')
+                    AND n.evntntNote <> 'DELETED'
+                ORDER BY 
+                    a.astDisplay DESC;
+                """,
+                (start_dt, end_dt)
+            )
 
-        rows = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
         data = [dict(zip(columns, row)) for row in rows]
 
         # Add period to each entry
@@ -1795,14 +1964,51 @@ async def get_idf_analysis(
         return data
 
     # Run queries for both date ranges and merge the results
-    period1_data = run_query(startdate1, enddate1, 'period 1')
-    period2_data = run_query(startdate2, enddate2, 'period 2')
+    # Run both periods at once, each on its own connection
+    period1_data, period2_data = await gather_queries(
+        run_query(startdate1, enddate1, 'period 1'),
+        run_query(startdate2, enddate2, 'period 2'),
+    )
 
     # Combine the data from both periods
     combined_data = period1_data + period2_data
 
     return {"idfAnalysisDataSet": combined_data}
 
+#----------------------------------------------Batch------------------------------------------------------------------
+# BATCH REPORT API
+@app.post("/batch")
+async def run_report_batch(batch: schemas.BatchRequest, request: Request):
+    """
+    Serve several report endpoints in one round trip, e.g. a whole dashboard page:
+    {"requests": [{"id": "legend", "path": "/stoppage_legend", "params": {"startdate": "...", "enddate": "..."}}]}
+    Each item reports its own status, so one failing panel doesn't fail the batch,
+    and successful items carry the result's "age" in seconds and a "stale" flag.
+    """
+    return {"results": await run_batch(batch.requests, request)}
+
+
+#----------------------------------------------Diagnostics------------------------------------------------------------------
+# CONNECTION POOL STATS API
+@app.get("/pool_stats")
+def read_pool_stats():
+    return {
+        "pools": get_pool_stats(),
+        "snapshots": get_snapshot_stats(),
+        "executors": executor_stats(),
+        "admission": admission_stats(),
+    }
+
+# REPORT CACHE STATS API
+@app.get("/cache_stats")
+def read_cache_stats():
+    return {
+        **report_stats(),
+        "day_shards": shard_stats(),
+        "dimensions": dimension_cache.stats(),
+        "warmer": cache_warmer.stats(),
+        "users": user_cache.stats(),
+    }
 
 
 # reading from excel (raw data 2025)
@@ -0,0 +1,268 @@
+import threading
+import time
+
+import pyodbc
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the acquire timeout."""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used", "generation")
+
+    def __init__(self, conn, generation):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.generation = generation
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of pyodbc connections for a single data source.
+
+    Idle connections are recycled once they pass `max_idle` seconds unused or
+    `max_lifetime` seconds old, and every checkout is preceded by a cheap
+    liveness query so callers never get a connection the driver has dropped.
+    """
+
+    def __init__(
+        self,
+        name,
+        connect,
+        min_size=1,
+        max_size=5,
+        max_idle=300,
+        max_lifetime=3600,
+        acquire_timeout=30,
+        ping_query="SELECT 1",
+    ):
+        self.name = name
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.acquire_timeout = acquire_timeout
+        self.ping_query = ping_query
+
+        self._cond = threading.Condition()
+        self._idle = []  # used as a stack so the hottest connection is reused first
+        self._in_use = {}
+        self._size = 0
+        self._waiting = 0
+        self._generation = 0  # bumped by retire_all(); older connections are never reused
+
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "checkouts": 0,
+            "timeouts": 0,
+            "total_wait_secs": 0.0,
+            "max_wait_secs": 0.0,
+        }
+
+    # ---- checkout / checkin -------------------------------------------------
+
+    def acquire(self, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            record = None
+            create = False
+
+            with self._cond:
+                while True:
+                    record = self._pop_idle()
+                    if record is not None:
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"Timed out after {timeout}s waiting for a '{self.name}' connection"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if create:
+                try:
+                    record = _PooledConnection(self.connect(), self._generation)
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["created"] += 1
+            elif not self._ping(record.conn):
+                # Dead connection: drop it and go round again
+                with self._cond:
+                    self._stats["ping_failures"] += 1
+                self._discard(record)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._in_use[id(record.conn)] = record
+                self._stats["checkouts"] += 1
+                self._stats["total_wait_secs"] += waited
+                self._stats["max_wait_secs"] = max(self._stats["max_wait_secs"], waited)
+            return record.conn
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            record = self._in_use.pop(id(conn), None)
+        if record is None:
+            # Not ours (or released twice) - just make sure it is closed
+            self._close_quietly(conn)
+            return
+
+        if discard or self._is_expired(record, time.monotonic()):
+            self._discard(record)
+            return
+
+        try:
+            # Leave nothing half-finished on the connection for the next borrower
+            conn.rollback()
+        except pyodbc.Error:
+            self._discard(record)
+            return
+
+        record.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(record)
+            self._cond.notify()
+        self.prune()
+
+    # ---- maintenance ----------------------------------------------------------
+
+    def fill(self):
+        """Open connections until the pool holds at least `min_size`."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                record = _PooledConnection(self.connect(), self._generation)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+                self._idle.append(record)
+                self._cond.notify()
+
+    def prune(self):
+        """Close idle connections past their idle/lifetime limit, keeping `min_size` open."""
+        now = time.monotonic()
+        stale = []
+        with self._cond:
+            keep = []
+            for record in self._idle:
+                if self._is_expired(record, now) and self._size - len(stale) > self.min_size:
+                    stale.append(record)
+                else:
+                    keep.append(record)
+            self._idle = keep
+        for record in stale:
+            self._discard(record, recycled=True)
+
+    def retire_all(self):
+        """
+        Stop reusing every connection opened so far, e.g. after the database file
+        was swapped. Idle ones are closed now, checked-out ones when released.
+        """
+        with self._cond:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+        for record in idle:
+            self._discard(record, recycled=True)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for record in idle:
+            self._discard(record)
+
+    def stats(self):
+        with self._cond:
+            checkouts = self._stats["checkouts"]
+            return {
+                "name": self.name,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": self._waiting,
+                "generation": self._generation,
+                **self._stats,
+                "avg_wait_secs": round(self._stats["total_wait_secs"] / checkouts, 4) if checkouts else 0.0,
+            }
+
+    # ---- internals ------------------------------------------------------------
+
+    def _pop_idle(self):
+        # Called with the lock held
+        now = time.monotonic()
+        while self._idle:
+            record = self._idle.pop()
+            if self._is_expired(record, now):
+                self._size -= 1
+                self._stats["recycled"] += 1
+                self._stats["closed"] += 1
+                self._close_quietly(record.conn)
+                continue
+            return record
+        return None
+
+    def _is_expired(self, record, now):
+        return (
+            record.generation != self._generation
+            or now - record.last_used > self.max_idle
+            or now - record.created_at > self.max_lifetime
+        )
+
+    def _ping(self, conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.ping_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _discard(self, record, recycled=False):
+        self._close_quietly(record.conn)
+        with self._cond:
+            self._size -= 1
+            self._stats["closed"] += 1
+            if recycled:
+                self._stats["recycled"] += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
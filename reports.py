@@ -0,0 +1,227 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+import time
+from datetime import date, datetime
+
+from fastapi import Request, Response
+
+from .database import get_source_version
+from .db_session import DbSession
+from .result_cache import ResultCache, make_backend
+from .singleflight import SingleFlight
+
+# Reports of what is offline right now go stale with the clock, not only with the files
+LIVE_REPORT_TTL_SECS = 30
+# Past its TTL (or after its file changed) a result is still served, marked stale,
+# while it is refreshed in the background - for at most this long after it was stored
+REPORT_MAX_STALE_SECS = 3600
+# After a failed background refresh, wait this long before trying again
+REFRESH_RETRY_SECS = 15
+# Browsers may keep fresh reports for date ranges that ended before today this long;
+# everything else, stale results included, must be revalidated (cheaply, with
+# If-None-Match) on each use
+PAST_RANGE_MAX_AGE_SECS = 24 * 3600
+
+logger = logging.getLogger(__name__)
+
+report_flights = SingleFlight()
+report_cache = ResultCache(get_source_version, backend=make_backend("report_results"))
+
+# Report endpoints by path, for callers that run them outside of routing (e.g. /batch)
+report_endpoints = {}
+# Background refreshes in progress (asyncio only keeps weak references to tasks)
+_refresh_tasks = set()
+
+
+def make_key(name, params):
+    """
+    Cache/coalescing key: endpoint name plus its query parameters in a canonical order.
+
+    Values are used exactly as the endpoint receives them, so requests only share
+    a result when the endpoint would have computed the same one for each.
+    """
+    return (name, tuple(sorted(params.items())))
+
+
+def report_params(kwargs):
+    # Everything FastAPI passes to an endpoint except sessions and the request/response objects
+    return {
+        field: value
+        for field, value in kwargs.items()
+        if not isinstance(value, (DbSession, Request, Response))
+    }
+
+
+def is_error_result(result):
+    # Endpoints answer bad parameters (e.g. an unparseable date) with an {"error": ...} payload
+    return isinstance(result, dict) and "error" in result
+
+
+def report(name, sources=("access",), ttl=None, max_stale=REPORT_MAX_STALE_SECS):
+    """
+    Decorator for read-only report endpoints.
+
+    Results are cached per endpoint and parameters until the TTL runs out or one
+    of the `sources` files changes. After that the last good result is still
+    returned straight away (with Age/Warning headers) while it is refreshed in
+    the background; if the refresh fails it keeps being served until it is
+    `max_stale` seconds old. Concurrent misses for the same key share a single
+    execution; the sessions of the requests that wait never touch the database.
+    Error payloads are returned but never cached.
+
+    Responses carry an ETag for the cached result they came from, and a request
+    whose If-None-Match matches it gets a 304 without the result being serialized.
+    """
+    def decorator(func):
+        async def compute(key, kwargs):
+            versions = report_cache.versions(sources)
+            result = await func(**kwargs)
+            if is_error_result(result):
+                return report_cache.uncached(result, versions)
+            return await report_cache.set_async(key, result, versions, ttl)
+
+        async def cached_entry(key, kwargs):
+            # `(entry, fresh)`: the cached entry, computing it on a miss and
+            # refreshing it in the background when it is stale
+            entry, fresh = await report_cache.lookup_async(key, sources, max_stale)
+            if entry is None:
+                entry = await report_flights.do(key, lambda: compute(key, kwargs))
+                fresh = True
+            elif not fresh and not report_flights.in_flight(key):
+                failed_at = entry.refresh_failed_at
+                if failed_at is None or time.time() - failed_at >= REFRESH_RETRY_SECS:
+                    _refresh_in_background(key, compute, kwargs)
+            return entry, fresh
+
+        @functools.wraps(func)
+        async def wrapper(report_request: Request = None, report_response: Response = None, **kwargs):
+            params = report_params(kwargs)
+            key = make_key(name, params)
+            entry, fresh = await cached_entry(key, kwargs)
+
+            # HTTP caching only applies to the endpoint's own requests, not e.g. /batch items
+            if report_request is None or report_request.url.path != "/" + name:
+                return entry.value
+
+            headers = _cache_headers(key, params, entry, fresh)
+            if _etag_matches(report_request.headers.get("if-none-match"), headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+            report_response.headers.update(headers)
+            return entry.value
+
+        async def entry(report_request: Request = None, report_response: Response = None, **kwargs):
+            # Used by /batch, which reports each item's age and staleness itself
+            return await cached_entry(make_key(name, report_params(kwargs)), kwargs)
+
+        async def warm(report_request: Request = None, report_response: Response = None, refresh_within=0, **kwargs):
+            # Used by the background warmer: compute now unless the cached result is
+            # fresh and stays so for at least `refresh_within` more seconds
+            key = make_key(name, report_params(kwargs))
+            entry, fresh = await report_cache.lookup_async(key, sources, max_stale)
+            if not fresh or entry.expires_at - time.time() < refresh_within:
+                entry = await report_flights.do(key, lambda: compute(key, kwargs))
+            return entry, True
+
+        wrapper.entry = entry
+        wrapper.warm = warm
+
+        # Let FastAPI hand the wrapper the request and response too, for the cache headers
+        signature = inspect.signature(func)
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("report_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+            inspect.Parameter("report_response", inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+        ])
+
+        report_endpoints["/" + name] = wrapper
+        return wrapper
+
+    return decorator
+
+
+def _refresh_in_background(key, compute, kwargs):
+    async def refresh():
+        # The request that found the stale entry is answered before this runs, so
+        # use sessions of our own and don't watch its (closed) connection. The
+        # parameters are those the entry was computed from, i.e. the key's.
+        sessions = []
+        refresh_kwargs = {}
+        for field, value in kwargs.items():
+            if isinstance(value, DbSession):
+                session = DbSession(value.source)
+                session.endpoint_path = value.endpoint_path
+                sessions.append(session)
+                refresh_kwargs[field] = session
+            elif isinstance(value, Request):
+                refresh_kwargs[field] = None
+            elif isinstance(value, Response):
+                refresh_kwargs[field] = Response()
+        refresh_kwargs.update(key[1])
+        try:
+            entry = await compute(key, refresh_kwargs)
+        except Exception:
+            await report_cache.mark_refresh_failed_async(key)
+            raise
+        finally:
+            for session in sessions:
+                await session.close()
+        if is_error_result(entry.value):
+            # Not cached, so the stale entry stays; back off as after any failure
+            await report_cache.mark_refresh_failed_async(key)
+        return entry
+
+    def done(task):
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            logger.warning("Background refresh of %s failed, serving stale result: %r", key[0], error)
+
+    task = asyncio.ensure_future(report_flights.do(key, refresh))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+    task.add_done_callback(done)
+
+
+def _cache_headers(key, params, entry, fresh):
+    # A cache entry never changes, so its key and store time identify the exact bytes served
+    tag = hashlib.sha256(repr((key, entry.stored_at, entry.versions)).encode()).hexdigest()[:32]
+    headers = {
+        "ETag": f'"{tag}"',
+        "Age": str(int(entry.age())),
+        "Cache-Control": f"max-age={PAST_RANGE_MAX_AGE_SECS}" if fresh and _range_in_past(params) else "no-cache",
+    }
+    if not fresh:
+        warnings = ['110 - "Response is Stale"']
+        if entry.refresh_failed_at is not None:
+            warnings.append('111 - "Revalidation Failed"')
+        headers["Warning"] = ", ".join(warnings)
+    return headers
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag[2:] == etag if tag.startswith("W/") else tag == etag for tag in candidates)
+
+
+def _range_in_past(params):
+    # True when the report has end dates and every one of them is before today
+    end_dates = [value for field, value in params.items() if field.startswith("enddate")]
+    if not end_dates:
+        return False
+    try:
+        return all(datetime.strptime(value.strip(), "%Y-%m-%d").date() < date.today() for value in end_dates)
+    except (AttributeError, ValueError):
+        return False
+
+
+def report_stats():
+    return {"cache": report_cache.stats(), "singleflight": report_flights.stats()}
@@ -0,0 +1,185 @@
+import asyncio
+import os
+import time
+
+from .cache_backends import MemoryBackend, SqliteBackend
+
+# Report results kept in memory, least recently used evicted first
+RESULT_CACHE_MAX_ENTRIES = 500
+RESULT_CACHE_TTL_SECS = 300
+# Source file versions are re-read at most this often, not on every lookup
+VERSION_CHECK_INTERVAL_SECS = 2.0
+
+# Where cached results live: "memory" (per process) or "sqlite" (a local file
+# shared by all uvicorn workers on the machine)
+RESULT_CACHE_BACKEND = "sqlite"
+RESULT_CACHE_SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "results.sqlite3")
+
+
+def make_backend(table, kind=RESULT_CACHE_BACKEND):
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SqliteBackend(RESULT_CACHE_SQLITE_PATH, table)
+    raise ValueError(f"Unknown result cache backend: {kind}")
+
+
+class _Entry:
+    # Wall-clock times, so entries stay meaningful to other processes
+    __slots__ = ("value", "versions", "stored_at", "expires_at", "refresh_failed_at")
+
+    def __init__(self, value, versions, ttl):
+        self.value = value
+        self.versions = versions
+        self.stored_at = time.time()
+        self.expires_at = self.stored_at + ttl
+        self.refresh_failed_at = None
+
+    def age(self):
+        return time.time() - self.stored_at
+
+
+class ResultCache:
+    """
+    Size-bounded LRU of report results with per-entry TTL.
+
+    Each entry remembers the version (mtime) of the data sources it was computed
+    from; a lookup after any of those files changed is a miss and drops the entry.
+    `version_of(source)` returns the current version of a source.
+
+    `lookup()` instead keeps expired or outdated entries around as stale, so a
+    caller can serve them while it refreshes. An entry stored with no versions
+    only expires with its TTL.
+
+    Entries are kept by `backend` (see cache_backends.py); stats are per process.
+    Code on the event loop uses the `*_async` variants, which run the calls of a
+    blocking backend on a thread.
+    """
+
+    def __init__(self, version_of, max_entries=RESULT_CACHE_MAX_ENTRIES, default_ttl=RESULT_CACHE_TTL_SECS, backend=None):
+        self.version_of = version_of
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.backend = backend if backend is not None else MemoryBackend()
+        self._versions = {}  # source -> (checked_at, version)
+        self._stats = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "stores": 0,
+            "expired": 0, "invalidated": 0, "evicted": 0, "refresh_failures": 0,
+        }
+
+    def get(self, key, sources):
+        """Return `(True, value)` for a fresh entry, else `(False, None)`."""
+        entry = self.backend.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return False, None
+
+        if time.time() >= entry.expires_at:
+            self._drop(key, "expired")
+            return False, None
+        if entry.versions and entry.versions != self.versions(sources):
+            self._drop(key, "invalidated")
+            return False, None
+
+        self.backend.touch(key)
+        self._stats["hits"] += 1
+        return True, entry.value
+
+    def lookup(self, key, sources, max_stale):
+        """
+        Return `(entry, fresh)` for an entry stored at most `max_stale` seconds ago,
+        fresh or not, else `(None, False)`.
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None, False
+
+        if entry.age() > max_stale:
+            self._drop(key, "expired")
+            return None, False
+
+        fresh = time.time() < entry.expires_at and (not entry.versions or entry.versions == self.versions(sources))
+        self.backend.touch(key)
+        self._stats["hits" if fresh else "stale_hits"] += 1
+        return entry, fresh
+
+    def mark_refresh_failed(self, key):
+        entry = self.backend.get(key)
+        if entry is not None:
+            entry.refresh_failed_at = time.time()
+            self.backend.set(key, entry)
+        self._stats["refresh_failures"] += 1
+
+    def set(self, key, value, versions, ttl=None):
+        """Store `value`; `versions` must be read *before* the query ran so a change mid-query invalidates it."""
+        entry = _Entry(value, versions, self.default_ttl if ttl is None else ttl)
+        self.backend.set(key, entry)
+        self._stats["stores"] += 1
+        self._stats["evicted"] += self.backend.evict(self.max_entries)
+        return entry
+
+    def uncached(self, value, versions):
+        """An entry for a result that must not be stored, so it is served like any other."""
+        return _Entry(value, versions, 0)
+
+    async def lookup_async(self, key, sources, max_stale):
+        return await self._off_loop(self.lookup, key, sources, max_stale)
+
+    async def set_async(self, key, value, versions, ttl=None):
+        return await self._off_loop(self.set, key, value, versions, ttl)
+
+    async def mark_refresh_failed_async(self, key):
+        return await self._off_loop(self.mark_refresh_failed, key)
+
+    def versions(self, sources):
+        """`((source, version), ...)` for `sources`, as recorded with each entry."""
+        now = time.monotonic()
+        result = []
+        for source in sources:
+            checked = self._versions.get(source)
+            if checked is None or now - checked[0] >= VERSION_CHECK_INTERVAL_SECS:
+                checked = (now, self.version_of(source))
+                self._versions[source] = checked
+            result.append((source, checked[1]))
+        return tuple(result)
+
+    def export_entries(self):
+        """`[(key, entry)]` to persist, or None when the backend already keeps them on disk."""
+        if self.backend.persistent:
+            return None
+        return self.backend.items()
+
+    def import_entries(self, entries):
+        """Reload persisted entries, keeping only those computed from the current file versions."""
+        loaded = 0
+        for key, entry in entries:
+            sources = tuple(source for source, _ in entry.versions)
+            if entry.versions == self.versions(sources):
+                self.backend.set(key, entry)
+                loaded += 1
+        self.backend.evict(self.max_entries)
+        return loaded
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self._stats["hits"] + self._stats["stale_hits"] + self._stats["misses"]
+        return {
+            "backend": self.backend.name,
+            "entries": self.backend.count(),
+            "max_entries": self.max_entries,
+            **self._stats,
+            "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    async def _off_loop(self, func, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    def _drop(self, key, reason):
+        self.backend.delete(key)
+        self._stats[reason] += 1
+        self._stats["misses"] += 1
@@ -1,5 +1,14 @@
 from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
 
 class Login(BaseModel):
     email: str
     password: str
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    path: str
+    params: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
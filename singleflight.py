@@ -0,0 +1,60 @@
+import asyncio
+
+from .db_session import ClientDisconnected
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the work; callers arriving while
+    it is in flight wait for and share its result or error. If the leader's own
+    client disconnects or its task is cancelled, waiting callers start over
+    instead of inheriting an error that was not theirs.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._stats = {"executions": 0, "coalesced": 0}
+
+    async def do(self, key, func):
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                return await self._lead(key, func)
+
+            self._stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(future)
+            except ClientDisconnected:
+                continue
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    continue  # the leader was cancelled, not us
+                raise
+
+    async def _lead(self, key, func):
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self._stats["executions"] += 1
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Followers may all have gone; don't let asyncio warn about it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def in_flight(self, key):
+        return key in self._calls
+
+    def stats(self):
+        return {**self._stats, "in_flight": len(self._calls)}
@@ -0,0 +1,118 @@
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+
+class SnapshotManager:
+    """
+    Keeps a local, read-only copy of an Access file that lives in a synced folder.
+
+    `refresh()` copies the source whenever its mtime or size changes. Each copy
+    gets its own file name and only becomes current once it is complete, so a
+    connection never opens a half-written file. The directory is shared by all
+    worker processes, each switching to a new copy on its own refresh, so a copy
+    is only deleted once it has been superseded for `retire_after` seconds (and
+    no connection holds it open any more).
+    """
+
+    def __init__(self, name, source_path, snapshot_dir, retire_after=120):
+        self.name = name
+        self.source_path = source_path
+        self.snapshot_dir = snapshot_dir
+        self.retire_after = retire_after
+        self.current_path = None
+        self._source_signature = None  # (mtime, size) of the source the current copy was taken from
+        self._taken_at = None
+        self._lock = threading.Lock()
+        self._stats = {"refreshes": 0, "failed_refreshes": 0, "last_error": None}
+
+    def path(self):
+        """File that connections should open: the local copy, or the source until one exists."""
+        return self.current_path or self.source_path
+
+    def refresh(self):
+        """Copy the source if it changed since the last snapshot. Returns True if a new copy became current."""
+        with self._lock:
+            try:
+                signature = self._signature()
+                stem, ext = os.path.splitext(os.path.basename(self.source_path))
+                if signature == self._source_signature and self.current_path and os.path.exists(self.current_path):
+                    self._remove_old_copies(stem, ext)
+                    return False
+
+                os.makedirs(self.snapshot_dir, exist_ok=True)
+                target = os.path.join(self.snapshot_dir, f"{stem}.{int(signature[0])}.{signature[1]}{ext}")
+
+                # Another worker process may already have copied this version
+                if not (os.path.exists(target) and os.path.getsize(target) == signature[1]):
+                    partial = f"{target}.{os.getpid()}.partial"
+                    shutil.copyfile(self.source_path, partial)
+                    if self._signature() != signature:
+                        # Written to while we copied: the copy may be torn, try again next round
+                        os.remove(partial)
+                        raise OSError(f"{self.source_path} changed while it was being copied")
+                    os.replace(partial, target)
+            except OSError as e:
+                self._stats["failed_refreshes"] += 1
+                self._stats["last_error"] = str(e)
+                return False
+
+            self.current_path = target
+            self._source_signature = signature
+            self._taken_at = time.time()
+            self._stats["refreshes"] += 1
+            self._stats["last_error"] = None
+            self._remove_old_copies(stem, ext)
+            return True
+
+    def version(self):
+        """(mtime, size) of the source file the current copy was taken from."""
+        return self._source_signature
+
+    def age_secs(self):
+        if self._taken_at is None:
+            return None
+        return round(time.time() - self._taken_at, 1)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "source_path": self.source_path,
+            "snapshot_path": self.current_path,
+            "source_mtime": datetime.fromtimestamp(self._source_signature[0]).isoformat() if self._source_signature else None,
+            "taken_at": datetime.fromtimestamp(self._taken_at).isoformat() if self._taken_at else None,
+            "age_secs": self.age_secs(),
+            **self._stats,
+        }
+
+    def _signature(self):
+        st = os.stat(self.source_path)
+        return (st.st_mtime, st.st_size)
+
+    def _remove_old_copies(self, stem, ext):
+        # Copies in the order they were taken; each one is retired once the copy
+        # after it has existed long enough for every worker to have switched over
+        copies = []
+        for entry in os.listdir(self.snapshot_dir):
+            if entry.startswith(stem + ".") and entry.endswith(ext):
+                path = os.path.join(self.snapshot_dir, entry)
+                try:
+                    copies.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+        copies.sort()
+
+        now = time.time()
+        for (_, path), (superseded_at, _) in zip(copies, copies[1:]):
+            if path == self.current_path or now - superseded_at < self.retire_after:
+                continue
+            for stale in (path, os.path.splitext(path)[0] + ".laccdb"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    # Still open by a connection from the previous generation; next refresh retries
+                    break
@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+
+from ..reports import PAST_RANGE_MAX_AGE_SECS, _cache_headers
+from ..result_cache import _Entry
+
+PAST_PARAMS = {"startdate": "2024-01-01", "enddate": "2024-01-31"}
+
+
+def _entry():
+    return _Entry({"rows": []}, (("access", 1.0),), ttl=60)
+
+
+def test_fresh_past_range_may_be_kept():
+    headers = _cache_headers(("r", ()), PAST_PARAMS, _entry(), fresh=True)
+    assert headers["Cache-Control"] == f"max-age={PAST_RANGE_MAX_AGE_SECS}"
+    assert "Warning" not in headers
+
+
+def test_stale_past_range_must_be_revalidated():
+    headers = _cache_headers(("r", ()), PAST_PARAMS, _entry(), fresh=False)
+    assert headers["Cache-Control"] == "no-cache"
+    assert headers["Warning"].startswith("110")
+
+
+def test_range_ending_today_must_be_revalidated():
+    params = {"startdate": "2024-01-01", "enddate": date.today().isoformat()}
+    headers = _cache_headers(("r", ()), params, _entry(), fresh=True)
+    assert headers["Cache-Control"] == "no-cache"
+
+
+def test_range_ending_yesterday_is_past():
+    params = {"startdate": "2024-01-01", "enddate": (date.today() - timedelta(days=1)).isoformat()}
+    headers = _cache_headers(("r", ()), params, _entry(), fresh=True)
+    assert headers["Cache-Control"].startswith("max-age=")
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pytest
+
+from ..timesheet import timesheet_charts, timesheet_hours
+
+
+@pytest.mark.parametrize("start, end", [
+    (datetime(2024, 3, 1, 8, 0), datetime(2024, 3, 1, 9, 30)),
+    ("2024-03-01 08:00:00", "2024-03-01 09:30:00"),
+    ("2024-03-01T08:00:00", "2024-03-01T09:30:00"),
+    ("2024-03-01T08:00:00.250000", "2024-03-01T09:30:00.250000"),
+    (datetime(2024, 3, 1, 8, 0), "2024-03-01T09:30:00"),
+])
+def test_hours_from_dates_and_text_timestamps(start, end):
+    assert timesheet_hours(start, end) == pytest.approx(1.5)
+
+
+def test_charts_sorted_by_service_center_with_category_fallback():
+    charts = timesheet_charts([
+        ("South", "0", "Repair", 2.0),
+        ("North", "Travel", "WO-1", 1.0),
+        ("North", "0", "0-Admin", 0.5),
+        ("North", "0", "0-Admin", 0.25),
+    ])
+    assert charts == [
+        {"service_center": "North", "data": [
+            {"category": "Travel", "duration_hours": 1.0, "is_non_order": False},
+            {"category": "0-Admin", "duration_hours": 0.75, "is_non_order": True},
+        ]},
+        {"service_center": "South", "data": [
+            {"category": "Repair", "duration_hours": 2.0, "is_non_order": False},
+        ]},
+    ]
@@ -0,0 +1,49 @@
+from collections import defaultdict
+from datetime import datetime
+
+# Pie chart aggregation for the FEMS timesheet report, kept free of database
+# imports so it can be used (and tested) on its own
+
+
+def timesheet_hours(start_time, end_time):
+    # Some Access databases return datetime.datetime, while others return strings — handle both cases for compatibility:
+    if isinstance(start_time, str):
+        start_time = datetime.fromisoformat(start_time)
+    if isinstance(end_time, str):
+        end_time = datetime.fromisoformat(end_time)
+    return (end_time - start_time).total_seconds() / 3600
+
+
+def timesheet_charts(durations):
+    """Pie chart data per service center, in service center order, from `(service_center, worktype, work_order_type, hours)` rows."""
+    result = defaultdict(lambda: defaultdict(lambda: {"duration_hours": 0.0, "is_non_order": False}))
+
+    for service_center, worktype, work_order_type, duration in durations:
+        category = worktype if worktype != "0" else work_order_type
+        is_non_order = category.startswith("0")
+
+        result[service_center][category]["duration_hours"] += duration
+        result[service_center][category]["is_non_order"] = is_non_order  # store flag
+
+    # Format result for frontend
+    charts = []
+    for sc in sorted(result, key=_service_center_order):
+        charts.append({
+            "service_center": sc,
+            "data": [
+                {
+                    "category": cat,
+                    "duration_hours": round(values["duration_hours"], 2),
+                    "is_non_order": values["is_non_order"]
+                }
+                for cat, values in result[sc].items()
+            ]
+        })
+    return charts
+
+
+def _service_center_order(service_center):
+    # As Access sorted them: NULL first, then case-insensitively
+    if service_center is None:
+        return (0, "")
+    return (1, str(service_center).casefold())
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Resolved users (with their role loaded) kept in memory, so authenticated requests
+# don't look the user up in Postgres every time. Invalidation only reaches the
+# cache of the worker that made the change, so the TTL is also the longest a
+# change (a deactivated user, a new role) can take to reach the other workers.
+USER_CACHE_TTL_SECS = 30
+USER_CACHE_MAX_ENTRIES = 1000
+
+
+class UserCache:
+    """
+    TTL- and size-bounded cache of detached `models.User` objects, by usrid and email.
+
+    The cached objects are shared between requests and must only be read. Anything
+    that changes a user or a role should call `invalidate_user`/`invalidate_role`;
+    writes through an ORM Session do so automatically (see the events below), but
+    Core statements run on a plain connection do not. Either way only this
+    process is invalidated: other workers see the change when their entry
+    expires, at most `ttl` seconds later.
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL_SECS, max_entries=USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._users = OrderedDict()  # usrid -> (user, expires_at)
+        self._ids_by_email = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get_by_email(self, email):
+        with self._lock:
+            return self._get(self._ids_by_email.get(email))
+
+    def get_by_id(self, usrid):
+        with self._lock:
+            return self._get(usrid)
+
+    def put(self, user):
+        with self._lock:
+            self._remove(user.usrid)
+            self._users[user.usrid] = (user, time.monotonic() + self.ttl)
+            self._ids_by_email[user.usremail] = user.usrid
+            while len(self._users) > self.max_entries:
+                oldest = next(iter(self._users))
+                self._remove(oldest)
+
+    def invalidate_user(self, usrid=None, email=None):
+        with self._lock:
+            if usrid is None:
+                usrid = self._ids_by_email.get(email)
+            if self._remove(usrid):
+                self._stats["invalidations"] += 1
+
+    def invalidate_role(self, usrrlid):
+        with self._lock:
+            affected = [usrid for usrid, (user, _) in self._users.items() if user.usrrlid == usrrlid]
+            for usrid in affected:
+                self._remove(usrid)
+            self._stats["invalidations"] += len(affected)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._ids_by_email.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._users), "max_entries": self.max_entries, "ttl_secs": self.ttl, **self._stats}
+
+    def _get(self, usrid):
+        cached = self._users.get(usrid)
+        if cached is None:
+            self._stats["misses"] += 1
+            return None
+        user, expires_at = cached
+        if time.monotonic() >= expires_at:
+            self._remove(usrid)
+            self._stats["misses"] += 1
+            return None
+        self._users.move_to_end(usrid)
+        self._stats["hits"] += 1
+        return user
+
+    def _remove(self, usrid):
+        cached = self._users.pop(usrid, None)
+        if cached is None:
+            return False
+        email = cached[0].usremail
+        if self._ids_by_email.get(email) == usrid:
+            del self._ids_by_email[email]
+        return True
+
+
+user_cache = UserCache()
+
+
+# Invalidation hooks: any ORM write to a user or role drops what it affects
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, target):
+    user_cache.invalidate_user(usrid=target.usrid)
+
+@event.listens_for(models.UserRole, "after_update")
+@event.listens_for(models.UserRole, "after_delete")
+def _role_changed(mapper, connection, target):
+    user_cache.invalidate_role(target.usrrlid)
+
+# Bulk update()/delete() statements run through a Session skip the mapper events
+# and may touch any number of rows, so they drop the whole cache
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_write(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (models.User, models.UserRole):
+        user_cache.clear()
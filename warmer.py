@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import date, timedelta
+
+from .batch import run_batch
+from .cache_backends import SqliteLease
+from .database import get_source_version
+from .reports import report_cache
+from .result_cache import RESULT_CACHE_SQLITE_PATH
+from .schemas import BatchItem
+
+# Reports kept warm for the date windows operators open most, so nobody pays for
+# a cold query when they open a dashboard
+WARM_PATHS = [
+    "/stoppage_headings",
+    "/summary_stoppages",
+    "/stoppage_legend",
+    "/services_details",
+    "/get_services",
+    "/faults_details",
+    "/get_faults",
+    "/idf_faults_heading",
+    "/get_idf",
+    "/get_rcc_response_time",
+]
+WARM_SOURCES = ("access",)
+WARM_ENABLED = True
+# Re-warm this often, and as soon as a source file has changed. Each run recomputes
+# the results that would expire before the next one, so the windows never go cold
+WARM_INTERVAL_SECS = 240
+WARM_CHECK_INTERVAL_SECS = 30
+# Reports are warmed one at a time, so warming never takes more than one
+# admission slot from the requests of real users
+WARM_MAX_PARALLEL = 1
+# With a shared (SQLite) result cache only the worker holding this lease warms;
+# it is renewed on every check and passes to another worker if the holder dies
+WARM_LEASE_SECS = 300
+
+logger = logging.getLogger(__name__)
+
+
+def standard_windows(today=None):
+    """The dashboard's preset ranges, as inclusive (start, end) dates."""
+    today = today or date.today()
+    month_start = today.replace(day=1)
+    last_month_end = month_start - timedelta(days=1)
+    return {
+        "today": (today, today),
+        "last_7_days": (today - timedelta(days=6), today),
+        "this_month": (month_start, today),
+        "last_month": (last_month_end.replace(day=1), last_month_end),
+    }
+
+
+class CacheWarmer:
+    """
+    Background task that refreshes the standard windows on a cadence and after file changes.
+
+    Every uvicorn worker runs one; when the report cache is shared between them,
+    only the worker holding the warm lease does any work.
+    """
+
+    def __init__(self, paths=WARM_PATHS, sources=WARM_SOURCES):
+        self.paths = paths
+        self.sources = sources
+        self._versions = None
+        self._last_run = None
+        self._lease = None
+        if report_cache.backend.persistent:
+            self._lease = SqliteLease(RESULT_CACHE_SQLITE_PATH, "cache_warmer", f"{os.getpid()}:{uuid.uuid4().hex}")
+        self._leader = self._lease is None
+        self._stats = {"runs": 0, "failed_items": 0, "last_run_at": None, "last_duration_secs": None}
+
+    async def run_forever(self):
+        try:
+            while True:
+                await self._check()
+                await asyncio.sleep(WARM_CHECK_INTERVAL_SECS)
+        finally:
+            if self._lease is not None and self._leader:
+                self._lease.release()
+
+    async def _check(self):
+        try:
+            if self._lease is not None:
+                self._leader = await asyncio.to_thread(self._lease.acquire, WARM_LEASE_SECS)
+                if not self._leader:
+                    return
+            versions = tuple(get_source_version(source) for source in self.sources)
+            due = self._last_run is None or time.monotonic() - self._last_run >= WARM_INTERVAL_SECS
+            if due or versions != self._versions:
+                self._versions = versions
+                await self.warm()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Cache warming failed: %s", e)
+
+    async def warm(self):
+        started = time.monotonic()
+        self._last_run = started
+        failed = 0
+        # One batch per window keeps each batch within BATCH_MAX_ITEMS
+        for window, (start, end) in standard_windows().items():
+            items = [
+                BatchItem(
+                    id=f"{path}:{window}",
+                    path=path,
+                    params={"startdate": start.isoformat(), "enddate": end.isoformat()},
+                )
+                for path in self.paths
+            ]
+            results = await run_batch(
+                items, None, warm=True, max_parallel=WARM_MAX_PARALLEL,
+                refresh_within=WARM_INTERVAL_SECS + WARM_CHECK_INTERVAL_SECS,
+            )
+            for result in results:
+                if result["status"] != 200:
+                    failed += 1
+                    logger.info("Warming %s failed: %s %s", result["id"], result["status"], result.get("error"))
+            if self._lease is not None:
+                # A long run keeps the lease, so no other worker starts warming meanwhile
+                await asyncio.to_thread(self._lease.acquire, WARM_LEASE_SECS)
+
+        self._stats["runs"] += 1
+        self._stats["failed_items"] += failed
+        self._stats["last_run_at"] = time.time()
+        self._stats["last_duration_secs"] = round(time.monotonic() - started, 2)
+
+    def stats(self):
+        return {"paths": len(self.paths), "interval_secs": WARM_INTERVAL_SECS, "leader": self._leader, **self._stats}
+
+
+cache_warmer = CacheWarmer()